@@ -0,0 +1,287 @@
+import numpy as np
+from math import log2, exp, floor, ceil
+from statistics import NormalDist
+from exchange import StockExchange
+from stock import OULogStock
+from qtable import DenseQTable
+from qlearner import TabularQMatrix
+from sarsa import TabularSarsaMatrix
+from rng import replica_seeds
+
+class _ReplicaStreams(object):
+    ''' One random stream per replica, pre-drawn in blocks and served by a cursor per replica
+    The values served to a replica are exactly the sequence its own generator would produce
+    Attributes:
+        _generators (list): one np.random.Generator per replica
+        _method (str): name of the Generator method that draws a block, e.g. random or standard_normal
+        _buffer (np.ndarray): pre-drawn values with shape (n_replicas, block)
+        _cursor (np.ndarray): position of the next value to serve for each replica
+    '''
+    def __init__(self, seeds: list, method: str, block: int):
+        self._generators = [np.random.default_rng(seed) for seed in seeds]
+        self._method = method
+        self._block = block
+        self._buffer = np.empty((len(seeds), block))
+        for i, generator in enumerate(self._generators):
+            self._buffer[i] = getattr(generator, method)(block)
+        self._cursor = np.zeros(len(seeds), dtype=np.intp)
+
+    def draw(self, rows: np.ndarray):
+        ''' Serve the next value to each of the given replicas
+        Args:
+            rows (np.ndarray): indices of the replicas that draw
+        Returns:
+            np.ndarray: one value per row
+        '''
+        for i in rows[self._cursor[rows] == self._block]:
+            self._buffer[i] = getattr(self._generators[i], self._method)(self._block)
+            self._cursor[i] = 0
+        values = self._buffer[rows, self._cursor[rows]]
+        self._cursor[rows] += 1
+        return values
+
+def stationary_price_range(stock: OULogStock, tick: float, tail=1e-4):
+    ''' Find a price range that holds the stock with probability 1 - 2 * tail under the stationary law of its log price
+    The stationary law of logS is normal with mean mu and variance sigma**2 / (2 * kappa). The range is widened to
+    include the current price, rounded outward to tick and kept within [minp, maxp]
+    Args:
+        stock (OULogStock): the stock, with kappa > 0
+        tick (float): the price tick size of the exchange
+        tail (float): probability of the stationary price falling below the range, and also above it
+    Returns:
+        tuple: (low, high) to pass as price_range to BatchStockTradingEnvironment
+    '''
+    assert stock.kappa > 0 and 0 < tail < 0.5
+    z = NormalDist().inv_cdf(1 - tail) * stock.sigma / (2 * stock.kappa)**0.5
+    low = min(exp(stock.mu - z), stock.price)
+    high = max(exp(stock.mu + z), stock.price)
+    low = max(stock.minp, stock.minp + floor((low - stock.minp) / tick) * tick)
+    high = min(stock.maxp, stock.minp + ceil((high - stock.minp) / tick) * tick)
+    return low, high
+
+class BatchStockTradingEnvironment(object):
+    ''' Run n_replicas independent copies of one stock, one exchange and one tabular trader in lockstep
+    The price state, holdings, wealth, rewards and Q tables of all replicas live in numpy arrays,
+    so one step is a handful of array operations instead of n_replicas Python steps.
+    The update rules are the same as in OULogStock, StockExchange, StockTrader and the tabular learners.
+    Replica i draws the same random values as a scalar run whose stock and learner are seeded with replica_seeds(seed)[i],
+    so it reproduces that run step for step, as long as its price stays within price_range.
+    Memory: the Q table of each replica holds nprice * nholding * naction values, see table_nbytes. With the settings
+    of main.py (prices 0 to 500 by tick 0.1, max_holding 1000 by lot 10, 11 actions) that is 5001 * 201 * 11 values,
+    88 MB per replica as float64. The table is allocated zeroed, so the operating system only commits the pages of
+    price rows a replica visits, but for thousands of replicas narrow the grid with price_range, e.g. from
+    stationary_price_range, and use dtype=np.float32: about 25 MB per replica before any lazy commit for main.py.
+    Attributes:
+        n_replicas (int): number of independent replicas
+        actions (tuple): the list of all possible actions
+        price (np.ndarray): the internal stock price of each replica
+        prev_price (np.ndarray): the one-step previous stock price rounded to tick
+        curr_price (np.ndarray): the current stock price rounded to tick
+        holding (np.ndarray): the number of shares in holding of each replica
+        transaction_cost (np.ndarray): cost of the latest trade of each replica
+        wealth (np.ndarray): the cumulative wealth of each replica
+        reward (np.ndarray): the most recent reward of each replica
+        step_count (int): the number of iterations completed in this episode, same for all replicas
+        Q (np.ndarray): the Q tables with shape (n_replicas, nprice, nholding, naction)
+        price_range (tuple): (low, high) prices of the first and last rows of Q, a price outside is mapped to the
+            nearest of the two
+        epsilon (float): constant used in epsilon greedy, decayed as in Learner.learn
+        count (int): number of learning steps done by each learner
+    '''
+    def __init__(self, exchange: StockExchange, trader, n_replicas: int, seed=None, block=1024, dtype=np.float64,
+    price_range=None):
+        ''' Replicate the given exchange and trader
+        Args:
+            exchange (StockExchange): the template exchange, its stock must be an OULogStock and it must have no
+                buffered prices left, see StockExchange.sync_price
+            trader (StockTrader): the template trader, its learner must be TabularSarsaMatrix or TabularQMatrix
+            n_replicas (int): number of independent replicas
+            seed (int): root seed passed to replica_seeds
+            block (int): number of random values pre-drawn per replica at a time
+            dtype (np.dtype): the dtype of Q
+            price_range (tuple): (low, high) prices covered by Q, multiples of tick above minp, default to the range
+                [minp, maxp] of the stock
+        '''
+        stock, learner = exchange.stock, trader.learner
+        assert isinstance(stock, OULogStock)
+        # with buffered prices left, stock.price is ahead of the price the traders see
+        assert exchange.buffered == 0, 'the exchange has buffered prices left, call exchange.sync_price first'
+        assert type(learner) in (TabularSarsaMatrix, TabularQMatrix)
+        assert n_replicas > 0
+        self.n_replicas = n_replicas
+        self._replicas = np.arange(n_replicas)
+        self._stock = stock
+        self._digits = exchange.roundings[exchange.tick]
+        self._lot = exchange.lot
+        self._tick = exchange.tick
+        self._max_holding = exchange.max_holding
+        self._utility = trader.utility
+        self._is_sarsa = isinstance(learner, TabularSarsaMatrix)
+        self.actions = learner._actions
+        self._action_values = np.array(self.actions, dtype=float)
+        self._learning_rate = learner._learning_rate
+        self._discount_factor = learner._discount_factor
+        self.epsilon = learner._epsilon
+        self.count = learner._count
+
+        self.price_range = (stock.minp, stock.maxp) if price_range is None else tuple(price_range)
+        low, high = self.price_range
+        assert stock.minp <= low < high <= stock.maxp
+        shape = DenseQTable.grid_shape(self.actions, low, high, exchange.tick, exchange.max_holding)
+        self.Q = np.zeros((n_replicas,) + shape, dtype=dtype)
+        self._layout = DenseQTable(self.actions, low, high, exchange.tick, exchange.max_holding,
+            values=self.Q[0], visited=np.zeros(shape, dtype=bool))
+        for ((price, holding), action), value in learner._Q.items():
+            index = (self._price_index(price), int(self._layout.holding_index(holding)), self.actions.index(action))
+            self.Q[(slice(None),) + index] = value
+
+        self.price = np.full(n_replicas, stock.price, dtype=float)
+        self.curr_price = np.full(n_replicas, exchange.curr_price, dtype=float)
+        self.prev_price = None
+        seeds = replica_seeds(seed, n_replicas)
+        self._stock_streams = _ReplicaStreams([pair[0] for pair in seeds], 'standard_normal', block)
+        self._learner_streams = _ReplicaStreams([pair[1] for pair in seeds], 'random', block)
+        self.reset_episode()
+
+    @staticmethod
+    def table_nbytes(exchange: StockExchange, actions: tuple, price_range=None, dtype=np.float64):
+        ''' Find the size of the Q table of one replica without allocating it
+        Args:
+            exchange (StockExchange): the template exchange
+            actions (tuple): the list of all possible actions
+            price_range (tuple): (low, high) prices covered by Q, default to the range [minp, maxp] of the stock
+        Returns:
+            int: number of bytes of Q per replica
+        '''
+        low, high = (exchange.stock.minp, exchange.stock.maxp) if price_range is None else price_range
+        shape = DenseQTable.grid_shape(actions, low, high, exchange.tick, exchange.max_holding)
+        return int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    def _price_index(self, price):
+        ''' Map prices to the rows of Q, clipping those outside price_range to the first or last row
+        '''
+        return np.clip(self._layout.price_index(price), 0, self.Q.shape[1] - 1)
+
+    def reset_episode(self):
+        ''' Reset at the beginning of an episode
+        '''
+        self.prev_price = None
+        self.holding = np.zeros(self.n_replicas, dtype=np.int64)
+        self.transaction_cost = np.zeros(self.n_replicas)
+        self.wealth = np.zeros(self.n_replicas)
+        self.reward = None
+        self.step_count = 0
+        self._last_index = None
+
+    def replica_table(self, replica: int):
+        ''' View the Q table of one replica as a DenseQTable, e.g. to plug it into a scalar learner
+        Args:
+            replica (int): index of the replica
+        Returns:
+            DenseQTable: a table sharing its values with Q[replica]
+        '''
+        layout = self._layout
+        return DenseQTable(self.actions, layout.minp, self.price_range[1], layout.tick, layout.max_holding,
+            values=self.Q[replica], visited=self.Q[replica] != 0)
+
+    def _find_actions_greedily(self, index: tuple, use_epsilon: bool):
+        ''' Vectorized MatrixLearner._find_action_greedily for all replicas
+        Args:
+            index (tuple): arrays of (price index, holding index) of the state of each replica
+            use_epsilon (bool): True if the randomization using epsilon is to be used
+        Returns:
+            np.ndarray: the index of the action found for each replica
+            np.ndarray: the value Q(s,a) of the action found for each replica
+        '''
+        q_rows = self.Q[(self._replicas,) + index]
+        best = np.argmax(q_rows, axis=1)
+        max_q = q_rows[self._replicas, best]
+        explore = np.zeros(self.n_replicas, dtype=bool)
+        if use_epsilon:
+            explore = self._learner_streams.draw(self._replicas) < self.epsilon
+        # a second draw either picks a random action, or breaks ties among actions with Q of 0
+        ties = q_rows == 0
+        redraw = np.flatnonzero(explore | (max_q == 0))
+        if redraw.size:
+            u = self._learner_streams.draw(redraw)
+            naction = len(self.actions)
+            nchoice = np.where(explore[redraw], naction, np.count_nonzero(ties[redraw], axis=1))
+            k = (u * nchoice).astype(np.intp)
+            candidates = np.where(explore[redraw, None], True, ties[redraw])
+            best[redraw] = np.argmax(np.cumsum(candidates, axis=1) > k[:, None], axis=1)
+            max_q[redraw] = q_rows[redraw, best[redraw]]
+        return best, max_q
+
+    def _learn(self):
+        ''' Vectorized learner step: SarsaLearner.learn or QLearner.learn for all replicas
+        Returns:
+            np.ndarray: the index of the new action of each replica
+        '''
+        index = (self._price_index(self.curr_price), self._layout.holding_index(self.holding))
+        if self._is_sarsa:
+            action, next_q = self._find_actions_greedily(index, use_epsilon=True)
+        elif self._last_index is not None:
+            _, next_q = self._find_actions_greedily(index, use_epsilon=False)
+        if self._last_index is not None:
+            last = (self._replicas,) + self._last_index
+            old_q = self.Q[last]
+            self.Q[last] = old_q + self._learning_rate * (self.reward + self._discount_factor * next_q - old_q)
+        if not self._is_sarsa:
+            action, _ = self._find_actions_greedily(index, use_epsilon=True)
+        self._last_index = index + (action,)
+        self.count += 1
+        self.epsilon = min(self.epsilon, 1 / log2(self.count))
+        return action
+
+    def _execute(self, action: np.ndarray):
+        ''' Vectorized StockTrader.place_order and StockExchange.execute for all replicas
+        '''
+        order = self._action_values[action].astype(np.int64)
+        order = np.clip(self.holding + order, -self._max_holding, self._max_holding) - self.holding
+        num_lots = np.abs(order) / self._lot
+        self.transaction_cost = num_lots * self._tick + num_lots**2 * self._tick
+        self.holding += order
+
+    def _simulate_stock_price(self, dt=1.0):
+        ''' Vectorized OULogStock.simulate_price and StockExchange.simulate_stock_price for all replicas
+        '''
+        stock = self._stock
+        alive = np.flatnonzero(self.price != 0)
+        price = self.price[alive]
+        dW = dt**0.5 * self._stock_streams.draw(alive)
+        dlogS = stock.kappa * (stock.mu - np.log(price)) * dt + stock.sigma * dW
+        price = price * np.exp(dlogS)
+        self.price[alive] = np.minimum(np.maximum(price, stock.minp), stock.maxp)
+        self.prev_price = self.curr_price
+        self.curr_price = np.round(self.price, self._digits)
+
+    def _update_traders(self):
+        ''' Vectorized StockTrader.get_updated_price for all replicas
+        '''
+        pnl = self.holding * (self.curr_price - self.prev_price)
+        delta_wealth = pnl - self.transaction_cost
+        self.wealth = self.wealth + delta_wealth
+        self.step_count += 1
+        self.reward = delta_wealth - 0.5 * self._utility * (delta_wealth - self.wealth / self.step_count)**2
+
+    def run(self, nrun: int, report=False):
+        ''' Run all replicas for nrun iterations, as StockTradingEnvironment.run does for one
+        Args:
+            nrun (int): number of iterations to run
+            report (boolean): True to return the wealth over time of each replica
+        Returns:
+            np.ndarray: wealth with shape (nrun+1, n_replicas) if report is True
+        '''
+        self.reset_episode()
+        if report is True:
+            result = np.empty((nrun + 1, self.n_replicas))
+            result[0] = self.wealth
+        for step_count in range(1, nrun+1):
+            self._execute(self._learn())
+            self._simulate_stock_price()
+            self._update_traders()
+            if report is True:
+                result[step_count] = self.wealth
+        if report is True:
+            return result
+        return None
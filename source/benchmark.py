@@ -0,0 +1,167 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from math import log
+import numpy as np
+from stock import OULogStock
+from exchange import StockExchange
+from environment import StockTradingEnvironment
+from registry import create_trader, create_learner
+
+# the trader types of the registry benchmarked, with the number of steps each one is run for by default
+TRADERS = {
+    'tabular q-learning': 20000,
+    'tabular sarsa': 20000,
+    'tabular sarsa lambda': 20000,
+    'tile coding sarsa': 20000,
+    'replay sarsa': 5000,
+    'random forest sarsa': 1000,
+    'svr sarsa': 2000,
+}
+
+# the approximator learner types of the registry whose refit latency is benchmarked
+REFIT_LEARNERS = ('random forest sarsa', 'svr sarsa')
+
+def make_cases(traders=tuple(TRADERS), naction=(11, 21), ntraders=(1, 4), scale=(1, 4)):
+    ''' Build the benchmark cases: every trader class in its default setting, then varied along each dimension
+    Args:
+        traders (tuple): names of trader types in TRADERS
+        naction (tuple): sizes of the action set, the first one is the default
+        ntraders (tuple): numbers of traders of the same class on one exchange, the first one is the default
+        scale (tuple): multiples of the default number of steps, the first one is the default
+    Returns:
+        list: a dict of settings per case
+    '''
+    cases = []
+    for trader in traders:
+        base = {'trader': trader, 'naction': naction[0], 'ntraders': ntraders[0], 'nsteps': TRADERS[trader] * scale[0]}
+        variants = [dict(base)]
+        variants += [dict(base, naction=n) for n in naction[1:]]
+        variants += [dict(base, ntraders=n) for n in ntraders[1:]]
+        variants += [dict(base, nsteps=TRADERS[trader] * s) for s in scale[1:]]
+        for case in variants:
+            case['name'] = '{trader} naction={naction} ntraders={ntraders} nsteps={nsteps}'.format(**case)
+            cases.append(case)
+    return cases
+
+def _build(case: dict):
+    lot = 10
+    half = case['naction'] // 2
+    actions = tuple(range(-half*lot, (half+1)*lot, lot))
+    exchange = StockExchange(OULogStock(100, 500, 0, 0.1, log(150), 0.1, seed=0), lot, 0.1, 100*lot)
+    for i in range(case['ntraders']):
+        trader = create_trader(case['trader'], '{} {}'.format(case['trader'], i), 1e-3, exchange, actions, 0.1, 0.5, 0.999)
+        trader.learner.reseed(i)
+    return StockTradingEnvironment(exchange)
+
+def run_case(case: dict, memory=True):
+    ''' Measure the speed of one case, then its peak memory in a second identical run
+    Returns:
+        dict: steps_per_second, trader_steps_per_second and peak_memory_mb of the case
+    '''
+    environment = _build(case)
+    start = time.perf_counter()
+    environment.run(case['nsteps'])
+    seconds = time.perf_counter() - start
+    result = {'steps_per_second': case['nsteps'] / seconds,
+        'trader_steps_per_second': case['nsteps'] * case['ntraders'] / seconds}
+    if memory:
+        environment = _build(case)
+        tracemalloc.start()
+        environment.run(case['nsteps'])
+        result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+def run_refit(name: str, size: int, repeat=3):
+    ''' Measure the latency of one inline refit of an approximator learner on a synthetic Q of a given size
+    Returns:
+        dict: the best refit_seconds over repeat fits
+    '''
+    rng = np.random.default_rng(0)
+    actions = tuple(range(-50, 60, 10))
+    learner = create_learner(name, actions, 0.1, 0.5, 0.999)
+    prices = np.round(rng.uniform(50, 300, size), 1).tolist()
+    holdings = (rng.integers(-100, 101, size) * 10).tolist()
+    for price, holding, action, value in zip(prices, holdings, rng.choice(actions, size).tolist(), rng.normal(0, 100, size).tolist()):
+        learner._set_q((price, holding), action, value)
+    X, Y = learner._training_data()
+    for _ in range(repeat):
+        learner.scheduler.submit(learner.model, X, Y)
+    return {'q_size': len(learner._Q), 'refit_seconds': min(learner.scheduler.fit_durations)}
+
+def run_all(cases: list, refit_learners=REFIT_LEARNERS, refit_sizes=(1000, 4000, 16000), memory=True,
+    log_file=sys.stderr):
+    ''' Run every case and every refit latency measurement
+    Args:
+        cases (list): as built by make_cases
+        refit_learners (tuple): names of learners in REFIT_LEARNERS to measure the refit latency of
+        refit_sizes (tuple): the sizes of Q to measure the refit latency at
+        memory (bool): True to also measure peak memory
+        log_file (file): where to print progress
+    Returns:
+        dict: the results, keyed by case name, with the machine they ran on
+    '''
+    results = {'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+        'processor': platform.processor(), 'system': platform.platform()}, 'cases': {}, 'refits': {}}
+    for case in cases:
+        results['cases'][case['name']] = run_case(case, memory)
+        print('{}: {steps_per_second:,.0f} steps/s'.format(case['name'], **results['cases'][case['name']]), file=log_file)
+    for name in refit_learners:
+        for size in refit_sizes:
+            key = '{} q_size={}'.format(name, size)
+            results['refits'][key] = run_refit(name, size)
+            print('{}: {refit_seconds:.3f}s per refit'.format(key, **results['refits'][key]), file=log_file)
+    return results
+
+def compare(results: dict, baseline: dict, threshold=0.2):
+    ''' Find the regressions of results against a baseline
+    A regression is a drop of steps/sec, or a rise of peak memory or refit latency, by more than threshold
+    Args:
+        results (dict): as returned by run_all
+        baseline (dict): as returned by run_all, typically loaded from JSON
+        threshold (float): the tolerated relative change
+    Returns:
+        list: a message per regression
+    '''
+    regressions = []
+    checks = [('cases', 'steps_per_second', -1), ('cases', 'peak_memory_mb', 1), ('refits', 'refit_seconds', 1)]
+    for group, metric, sign in checks:
+        for name, old in baseline.get(group, {}).items():
+            new = results[group].get(name)
+            if new is None or metric not in new or metric not in old:
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            if sign * change > threshold:
+                regressions.append('{} {}: {:.4g} -> {:.4g} ({:+.0%})'.format(name, metric, old[metric], new[metric], change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark steps/sec, peak memory and refit latency of the traders')
+    parser.add_argument('--traders', nargs='+', default=list(TRADERS), choices=list(TRADERS))
+    parser.add_argument('--refit-sizes', nargs='*', type=int, default=[1000, 4000, 16000],
+        help='sizes of Q to measure the refit latency of the selected approximator learners at')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory runs')
+    parser.add_argument('--save', help='write the results to this JSON file, e.g. a new baseline')
+    parser.add_argument('--baseline', help='compare the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='tolerated relative change against the baseline')
+    args = parser.parse_args()
+    refit_learners = tuple(name for name in args.traders if name in REFIT_LEARNERS)
+    results = run_all(make_cases(tuple(args.traders)), refit_learners, tuple(args.refit_sizes), not args.no_memory)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for message in regressions:
+            print('REGRESSION ' + message)
+        if regressions:
+            sys.exit(1)
+        print('no regression beyond {:.0%}'.format(args.threshold))
+
+if __name__ == '__main__':
+    main()
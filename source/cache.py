@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+class PredictionCache(object):
+    ''' A bounded LRU cache of model predictions, each entry stamped with the generation of the model that made it
+    Bumping the generation invalidates all entries at once. Stale entries are dropped lazily when looked up or evicted.
+    Attributes:
+        capacity (int): the max number of entries
+        generation (int): the generation of the model currently serving predictions
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups not found, or found stale
+        _entries (OrderedDict): map each key to the pair (generation, value), least recently used first
+    '''
+    def __init__(self, capacity: int):
+        assert capacity > 0
+        self.capacity = capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        ''' float: the fraction of lookups answered from the cache
+        '''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        ''' Look up the prediction for key made by the current model
+        Args:
+            key (object): hashable key, e.g. the tuple (s,a)
+        Returns:
+            float: the cached prediction, or None if missing or stale
+        '''
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == self.generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value: float):
+        ''' Store the prediction for key made by the current model, evicting the least recently used entry if full
+        '''
+        self._entries[key] = (self.generation, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        ''' Mark all entries stale, e.g. when a newly fitted model is swapped in
+        '''
+        self.generation += 1
+
+    def stats(self):
+        ''' Returns:
+            dict: the counters of this cache
+        '''
+        return {'size': len(self._entries), 'capacity': self.capacity, 'generation': self.generation,
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate}
@@ -0,0 +1,154 @@
+import numpy as np
+
+class LearnerConvergence(object):
+    ''' Running convergence statistics of one learner, each updated in O(1) per step
+    Attributes:
+        td_error (float): exponential moving average of the absolute TD error, None before the first update
+        action_change (float): exponential moving average of 1 when an update changed the greedy action of a state
+            visited before, else 0, None before the first revisit
+        growth (float): exponential moving average of the number of keys added to _Q per step, None before a step
+        updates (int): number of training updates seen
+        q_size (int): len(_Q) at the end of the last step
+        _greedy (dict): map each updated state to the index of its greedy action after its last update
+    '''
+    def __init__(self, q_size: int):
+        self.td_error = None
+        self.action_change = None
+        self.growth = None
+        self.updates = 0
+        self.q_size = q_size
+        self._greedy = dict()
+
+    def as_dict(self):
+        return {'td_error': self.td_error, 'action_change': self.action_change, 'growth': self.growth,
+            'updates': self.updates, 'q_size': self.q_size, 'nstates': len(self._greedy)}
+
+def _smooth(average, value, smoothing):
+    return value if average is None else average + smoothing * (value - average)
+
+class ConvergenceMonitor(object):
+    ''' Watch the learners of a StockTradingEnvironment run converge, and tell the run when to stop training
+    While attached, the monitor wraps _train_internally of each learner to read the TD error of every update and,
+    if action_change is set, the greedy action of the updated state after the update, which costs one more
+    _get_q_row per step. After each step it compares len(_Q) with the previous step.
+    A learner has converged once every threshold given holds for its statistics, and the run stops once all learners
+    have converged for patience consecutive steps, but never before warmup steps. A threshold left to None is not
+    checked. Learners that do not compute a TD error, e.g. ReplaySarsaMatrix, never meet a td_error threshold.
+    Attributes:
+        td_error (float): converged when the moving average of |TD error| is at most this
+        action_change (float): converged when the moving average rate of greedy-action changes is at most this
+        growth (float): converged when the moving average of new _Q keys per step is at most this
+        smoothing (float): weight of the newest value in each moving average
+        warmup (int): number of steps of a run before it may stop
+        patience (int): number of consecutive converged steps needed to stop
+        stats (dict): map each trader name to its LearnerConvergence
+        steps (int): number of steps run while attached
+        steps_saved (int): number of steps of nrun the last run skipped by stopping early, 0 if it ran to the end
+        stopped_at (int): the step the last run stopped at, None if it ran to the end
+    '''
+    def __init__(self, td_error=None, action_change=None, growth=None, smoothing=0.001, warmup=1000, patience=1000):
+        assert 0 < smoothing <= 1 and warmup >= 0 and patience > 0
+        self.td_error = td_error
+        self.action_change = action_change
+        self.growth = growth
+        self.smoothing = smoothing
+        self.warmup = warmup
+        self.patience = patience
+        self.stats = dict()
+        self.steps = 0
+        self.steps_saved = 0
+        self.stopped_at = None
+        self._nrun = 0
+        self._streak = 0
+        self._wrapped = []
+        self._traders = []
+
+    def _watched(self, learner, stats: LearnerConvergence, method):
+        smoothing, track_actions = self.smoothing, self.action_change is not None
+        def watched(reward, next_value):
+            state = learner._last_state
+            learner._td_error = None
+            result = method(reward, next_value)
+            if learner._td_error is not None:
+                stats.td_error = _smooth(stats.td_error, abs(float(learner._td_error)), smoothing)
+                stats.updates += 1
+            if track_actions and state is not None and learner._last_action is not None:
+                greedy = int(np.argmax(learner._get_q_row(state)))
+                previous = stats._greedy.get(state)
+                if previous is not None:
+                    stats.action_change = _smooth(stats.action_change, float(greedy != previous), smoothing)
+                stats._greedy[state] = greedy
+            return result
+        return watched
+
+    def attach(self, traders: list, nrun: int):
+        ''' Install the monitor on the learners of the traders for a run of nrun steps
+        The statistics of a trader carry over from earlier runs with the same monitor
+        '''
+        self._traders = traders
+        self._nrun = nrun
+        self._streak = 0
+        self.steps_saved = 0
+        self.stopped_at = None
+        for trader in traders:
+            learner = trader.learner
+            stats = self.stats.setdefault(trader.name, LearnerConvergence(len(getattr(learner, '_Q', ()))))
+            # keep any wrapper already on the instance, e.g. from Instrumentation, and put it back on detach
+            previous = learner.__dict__.get('_train_internally')
+            learner._train_internally = self._watched(learner, stats, learner._train_internally)
+            self._wrapped.append((learner, previous))
+
+    def detach(self):
+        ''' Remove the monitor from the learners
+        '''
+        for learner, previous in reversed(self._wrapped):
+            if previous is None:
+                del learner._train_internally
+            else:
+                learner._train_internally = previous
+        self._wrapped = []
+
+    def converged(self, stats: LearnerConvergence):
+        ''' Returns:
+            bool: True if every threshold given holds for the statistics of one learner
+        '''
+        for threshold, value in ((self.td_error, stats.td_error), (self.action_change, stats.action_change),
+        (self.growth, stats.growth)):
+            if threshold is not None and (value is None or value > threshold):
+                return False
+        return True
+
+    def on_step(self, step_count: int):
+        ''' Called by the environment at the end of every step
+        Args:
+            step_count (int): the step just completed, starting at 1
+        Returns:
+            bool: True if the run should stop after this step
+        '''
+        self.steps += 1
+        for trader in self._traders:
+            stats = self.stats[trader.name]
+            q_size = len(getattr(trader.learner, '_Q', ()))
+            stats.growth = _smooth(stats.growth, q_size - stats.q_size, self.smoothing)
+            stats.q_size = q_size
+        if all(self.converged(self.stats[trader.name]) for trader in self._traders):
+            self._streak += 1
+        else:
+            self._streak = 0
+        if step_count >= self.warmup and self._streak >= self.patience and step_count < self._nrun:
+            self.stopped_at = step_count
+            self.steps_saved = self._nrun - step_count
+            return True
+        return False
+
+    def summary(self):
+        ''' Returns:
+            dict: the statistics of each trader, whether it has converged, and the steps saved by the last run
+        '''
+        return {
+            'steps': self.steps,
+            'stopped_at': self.stopped_at,
+            'steps_saved': self.steps_saved,
+            'traders': {name: dict(stats.as_dict(), converged=self.converged(stats))
+                for name, stats in self.stats.items()},
+        }
@@ -1,5 +1,7 @@
 import abc
+import numpy as np
 from exchange import StockExchange
+from report import PerformanceReport
 
 class Environment(abc.ABC):
     ''' Manage the interactions between a list of learners and exchanges
@@ -11,32 +13,148 @@ class Environment(abc.ABC):
         self.exchange = exchange
     
     @abc.abstractmethod
-    def run(self, nrun: int, report=False):
-        ''' Run the learners for nrun iterations
+    def run(self, nrun: int, report=False, progress=None, stream=None, instrumentation=None, monitor=None):
+        ''' Run the learners for nrun iterations, or fewer if monitor stops the run early
         Args:
             nrun (int): number of iterations to run
             report (boolean): True to return a performance over time of each trader
+            progress (callable): called with (step_count, nrun) once every 1000 iterations
+            stream (ReportWriter): if given, the performance of each trader is also streamed to disk, its names must be
+                those of exchange.traders in the same order
+            instrumentation (Instrumentation): if given, time the phases of each step during this run
+            monitor (ConvergenceMonitor): if given, stop once the learners have converged, see monitor.steps_saved
         Returns:
-            dict: map each trader to its performance over nrun steps
+            PerformanceReport: the wealth, holding, reward and transaction cost of each trader over the steps run
         '''
         raise NotImplementedError
 
+def print_progress(step_count: int, nrun: int):
+    ''' A progress callback that prints the number of finished runs
+    '''
+    print('finished {:,} runs'.format(step_count))
+
 class StockTradingEnvironment(Environment):
     # Override
-    def run(self, nrun, report=False):
+    def run(self, nrun, report=False, progress=None, stream=None, instrumentation=None, monitor=None):
         self.exchange.reset_episode()
+        traders = list(self.exchange.traders)
+        assert stream is None or list(stream.names) == [trader.name for trader in traders], \
+            'the stream columns {} do not match the traders {}'.format(stream.names, [trader.name for trader in traders])
+        if instrumentation is None and monitor is None:
+            return self._run(traders, nrun, report, progress, stream, None, None)
+        if instrumentation is not None:
+            instrumentation.attach(self.exchange, traders)
+        try:
+            if monitor is not None:
+                monitor.attach(traders, nrun)
+            try:
+                return self._run(traders, nrun, report, progress, stream, instrumentation, monitor)
+            finally:
+                if monitor is not None:
+                    monitor.detach()
+        finally:
+            if instrumentation is not None:
+                instrumentation.detach()
+
+    def _run(self, traders, nrun, report, progress, stream, instrumentation, monitor):
+        result = None
         if report is True:
-            result = {trader.name: [trader.wealth] for trader in self.exchange.traders}
+            result = PerformanceReport([trader.name for trader in traders], nrun+1)
+            result.record(traders)
+        if stream is not None:
+            stream.record(traders)
         for step_count in range(1,nrun+1):
-            for trader in self.exchange.traders:
-                trader.place_order()
-            self.exchange.simulate_stock_price()
+            self._step(traders)
 
             if report is True:
-                for trader in self.exchange.traders:
-                    result[trader.name].append(trader.wealth)
-            if step_count % 1000 == 0:
-                print('finished {:,} runs'.format(step_count))
+                result.record(traders)
+            if stream is not None:
+                stream.record(traders)
+            if instrumentation is not None:
+                instrumentation.on_step(step_count)
+            if progress is not None and step_count % 1000 == 0:
+                progress(step_count, nrun)
+            if monitor is not None and monitor.on_step(step_count):
+                break
+        if stream is not None:
+            stream.flush()
+        return result
+
+    def _step(self, traders: list):
+        ''' Run one iteration: every trader places its order, then the stock moves and the traders are notified
+        '''
+        for trader in traders:
+            trader.place_order()
+        self.exchange.simulate_stock_price()
+
+class SynchronousStockTradingEnvironment(StockTradingEnvironment):
+    ''' Run the traders of a StockExchange step-synchronously
+    Each step collects the orders of all traders into an array, executes them in one call to exchange.execute_orders,
+    optionally netting opposing orders, then moves the stock and updates the wealth and reward of all traders as
+    array operations, pushing the results back to the traders in their order of registration.
+    Without netting, a run gives the same results as StockTradingEnvironment
+    Attributes:
+        net (bool): True to net opposing orders before impact costs are charged
+    '''
+    def __init__(self, exchange: StockExchange, net=False):
+        super().__init__(exchange)
+        self.net = net
+
+    # Override
+    def _step(self, traders: list):
+        exchange = self.exchange
+        orders = np.array([trader.propose_order() for trader in traders], dtype=np.int64)
+        holding = np.array([trader.holding for trader in traders], dtype=np.int64)
+        orders, transaction_cost = exchange.execute_orders(holding, orders, self.net)
+        holding += orders
+        exchange.advance_price()
+        old_price, new_price = exchange.prev_price, exchange.curr_price
+        wealth = np.array([trader.wealth for trader in traders], dtype=float)
+        step_count = np.array([trader.step_count for trader in traders]) + 1
+        utility = np.array([trader.utility for trader in traders])
+        # vectorized StockTrader.get_updated_price
+        delta_wealth = holding * (new_price - old_price) - transaction_cost
+        wealth += delta_wealth
+        reward = delta_wealth - 0.5 * utility * (delta_wealth - wealth / step_count)**2
+        for trader, h, c, w, n, r in zip(traders, holding.tolist(), transaction_cost.tolist(), wealth.tolist(),
+        step_count.tolist(), reward.tolist()):
+            trader.holding = h
+            trader.transaction_cost = c
+            trader.wealth = w
+            trader.step_count = n
+            trader.reward = r
+            trader.state = (new_price, h)
+
+
+class MultiAssetTradingEnvironment(Environment):
+    ''' Run the MultiAssetStockTraders of a MultiAssetExchange, reporting one column per trader and stock
+    '''
+    # Override
+    def run(self, nrun, report=False, progress=None, stream=None, instrumentation=None, monitor=None):
+        assert stream is None and instrumentation is None and monitor is None, \
+            'streaming, instrumentation and monitoring support one stock only'
+        self.exchange.reset_episode()
+        traders = list(self.exchange.traders)
+        result = None
         if report is True:
-            return result
-        return None
\ No newline at end of file
+            names = ['{} {}'.format(trader.name, stock) for trader in traders for stock in self.exchange.names]
+            result = PerformanceReport(names, nrun+1)
+            self._record(result, traders)
+        for step_count in range(1,nrun+1):
+            for trader in traders:
+                trader.place_order()
+            self.exchange.simulate_stock_price()
+            if report is True:
+                self._record(result, traders)
+            if progress is not None and step_count % 1000 == 0:
+                progress(step_count, nrun)
+        return result
+
+    def _record(self, report: PerformanceReport, traders: list):
+        nan = np.full(len(self.exchange), np.nan)
+        report.append({
+            'wealth': np.concatenate([trader.wealth for trader in traders]),
+            'holding': np.concatenate([trader.holding for trader in traders]),
+            'reward': np.concatenate([nan if trader.reward is None else trader.reward for trader in traders]),
+            'transaction_cost': np.concatenate([trader.transaction_cost for trader in traders]),
+        })
@@ -0,0 +1,151 @@
+from math import log, inf
+import numpy as np
+from exchange import StockExchange
+from qtable import DenseQTable
+from stock import OULogStock
+from rng import RandomStream
+
+class GreedyPolicy(object):
+    ''' The frozen greedy policy of a learner over the (price, holding) grid of an exchange
+    The greedy action of a state is found with MatrixLearner.greedy_actions the first time the state is reached,
+    in one batch for all states newly reached in a step, then kept in a table. So each state is evaluated at most once,
+    the learner is never updated, and states that are never reached cost nothing, e.g. for a model-based learner
+    Attributes:
+        learner (MatrixLearner): the learner whose policy is frozen
+        table (np.ndarray): index in actions of the greedy action per (price index, holding index), -1 if not found yet
+        minp (float): the lowest price of the grid
+        tick (float): the price tick size
+        max_holding (int): the max number of shares that can be long or short
+        holding_step (int): holdings are always multiples of this step
+        _random (RandomStream): uniform values to break ties among actions with Q of 0
+    '''
+    def __init__(self, learner, exchange: StockExchange, seed=None):
+        stock = exchange.stock
+        shape = DenseQTable.grid_shape(learner._actions, stock.minp, stock.maxp, exchange.tick, exchange.max_holding)
+        self.learner = learner
+        self.table = np.full(shape[:2], -1, dtype=np.intp)
+        self.minp = stock.minp
+        self.tick = exchange.tick
+        self.max_holding = exchange.max_holding
+        self.holding_step = 2 * exchange.max_holding // (shape[1] - 1)
+        self._digits = exchange.roundings[exchange.tick]
+        self._random = RandomStream(seed)
+
+    def __len__(self):
+        ''' Returns:
+            int: number of states whose greedy action has been found
+        '''
+        return int(np.count_nonzero(self.table >= 0))
+
+    def nactions(self):
+        ''' Returns:
+            int: number of distinct greedy actions among the states found, 1 for a policy that ignores the state
+        '''
+        return len(np.unique(self.table[self.table >= 0]))
+
+    def price_index(self, price: np.ndarray):
+        return np.rint((price - self.minp) / self.tick).astype(np.intp)
+
+    def holding_index(self, holding: np.ndarray):
+        return (holding + self.max_holding) // self.holding_step
+
+    def actions(self, price_index: np.ndarray, holding_index: np.ndarray):
+        ''' Find the greedy action of many states, extracting those not in the table yet with one learner call
+        Args:
+            price_index (np.ndarray): the price index of each state
+            holding_index (np.ndarray): the holding index of each state
+        Returns:
+            np.ndarray: the index in actions of the greedy action of each state
+        '''
+        action = self.table[price_index, holding_index]
+        missing = action < 0
+        if missing.any():
+            index = np.unique(np.column_stack((price_index[missing], holding_index[missing])), axis=0)
+            # rebuild each state exactly as the exchange and trader see it, so known keys of _Q are found
+            states = [(round(self.minp + i * self.tick, self._digits), j * self.holding_step - self.max_holding)
+                for i, j in index.tolist()]
+            self.table[index[:, 0], index[:, 1]] = self.learner.greedy_actions(states, self._random)
+            action = self.table[price_index, holding_index]
+        return action
+
+def evaluate_policy(trader, npaths=1000, nsteps=1000, seed=None, policy=None, paths=False):
+    ''' Evaluate the frozen greedy policy of a trader on npaths independent price paths at once
+    Each step follows StockTrader.place_order, StockExchange.execute, OULogStock.simulate_price and
+    StockTrader.get_updated_price for all paths as array operations. The trader, its learner and its exchange are
+    left untouched, and all paths start from the current price of the exchange with no holding, even if the exchange
+    has simulated prices ahead in a buffer.
+    Args:
+        trader (StockTrader): the trader to evaluate, its exchange's stock must be an OULogStock
+        npaths (int): number of price paths
+        nsteps (int): number of steps of each path
+        seed (int): seed of the price paths and of the tie-breaking, None for fresh entropy
+        policy (GreedyPolicy): the policy to evaluate, e.g. to reuse one across calls, default to that of trader.learner
+        paths (bool): True to also return the wealth of every path over time
+    Returns:
+        dict: distribution statistics of the final wealth, reward, step pnl and max drawdown over the paths, and the
+            number of states reached and of distinct greedy actions taken in them, with the key wealth holding an
+            array with shape (nsteps+1, npaths) if paths is True
+    '''
+    exchange, stock = trader.exchange, trader.exchange.stock
+    assert isinstance(stock, OULogStock) and npaths > 0 and nsteps > 0
+    price_seed, policy_seed = np.random.SeedSequence(seed).spawn(2)
+    if policy is None:
+        policy = GreedyPolicy(trader.learner, exchange, policy_seed)
+    generator = np.random.default_rng(price_seed)
+    action_values = np.array(trader.learner._actions, dtype=np.int64)
+    digits = exchange.roundings[exchange.tick]
+    a, b, c = stock._ar1_coefficients(1.0)
+    lower = log(stock.minp) if stock.minp > 0 else -inf
+    upper = log(stock.maxp)
+
+    # a block-buffered stock runs ahead of the exchange, then start from the price the exchange is at
+    price = stock.price if exchange.buffered == 0 else exchange.curr_price
+    log_price = np.full(npaths, log(price) if price > 0 else -inf)
+    curr_price = np.full(npaths, exchange.curr_price, dtype=float)
+    holding = np.zeros(npaths, dtype=np.int64)
+    wealth = np.zeros(npaths)
+    peak = np.zeros(npaths)
+    max_drawdown = np.zeros(npaths)
+    reward_sum = np.zeros(npaths)
+    pnl_sum, pnl_sumsq = 0.0, 0.0
+    if paths:
+        wealth_paths = np.empty((nsteps + 1, npaths))
+        wealth_paths[0] = wealth
+    for step_count in range(1, nsteps + 1):
+        action = policy.actions(policy.price_index(curr_price), policy.holding_index(holding))
+        order = np.clip(holding + action_values[action], -exchange.max_holding, exchange.max_holding) - holding
+        num_lots = np.abs(order) / exchange.lot
+        transaction_cost = num_lots * exchange.tick + num_lots**2 * exchange.tick
+        holding += order
+
+        log_price = np.clip(a * log_price + b + c * generator.standard_normal(npaths), lower, upper)
+        prev_price = curr_price
+        curr_price = np.round(np.clip(np.exp(log_price), stock.minp, stock.maxp), digits)
+
+        delta_wealth = holding * (curr_price - prev_price) - transaction_cost
+        wealth += delta_wealth
+        reward_sum += delta_wealth - 0.5 * trader.utility * (delta_wealth - wealth / step_count)**2
+        np.maximum(peak, wealth, out=peak)
+        np.maximum(max_drawdown, peak - wealth, out=max_drawdown)
+        pnl_sum += delta_wealth.sum()
+        pnl_sumsq += np.dot(delta_wealth, delta_wealth)
+        if paths:
+            wealth_paths[step_count] = wealth
+
+    n = npaths * nsteps
+    pnl_mean = pnl_sum / n
+    pnl_std = max(pnl_sumsq / n - pnl_mean**2, 0.0)**0.5
+    p5, p25, p50, p75, p95 = np.percentile(wealth, (5, 25, 50, 75, 95))
+    result = {
+        'npaths': npaths, 'nsteps': nsteps, 'nstates': len(policy), 'nactions': policy.nactions(),
+        'mean_final_wealth': wealth.mean(), 'std_final_wealth': wealth.std(),
+        'min_final_wealth': wealth.min(), 'p5_final_wealth': p5, 'p25_final_wealth': p25,
+        'median_final_wealth': p50, 'p75_final_wealth': p75, 'p95_final_wealth': p95,
+        'max_final_wealth': wealth.max(),
+        'mean_reward': reward_sum.mean() / nsteps,
+        'mean_pnl': pnl_mean, 'std_pnl': pnl_std, 'sharpe': pnl_mean / pnl_std if pnl_std > 0 else 0.0,
+        'mean_max_drawdown': max_drawdown.mean(), 'worst_max_drawdown': max_drawdown.max(),
+    }
+    if paths:
+        result['wealth'] = wealth_paths
+    return result
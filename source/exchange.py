@@ -1,4 +1,5 @@
 from stock import Stock
+import numpy as np
 
 class StockExchange(object):
     ''' An exchange referencing one single stock and a set of stock traders
@@ -9,12 +10,15 @@ class StockExchange(object):
         lot (int): the lot size
         tick (float): the tick size for this single stock
         max_holding (int): the max number of shares a trader can long or short in cumulative
-        traders (set): a set of instances of StockTrader
+        traders (list): the instances of StockTrader, in order of registration
         prev_price (float): the one-step previous stock price rounded to tick
         curr_price (float): the current stock price rounded to tick
         roundings (dict): for convenience in rounding price to tick
+        block (int): number of future prices simulated at once with stock.simulate_path, None to simulate one per step
+        _buffer (list): future prices already simulated and rounded to tick
+        _cursor (int): position in _buffer of the next price
     '''
-    def __init__(self, stock: Stock, lot: int, tick: float, max_holding: int):
+    def __init__(self, stock: Stock, lot: int, tick: float, max_holding: int, block=None):
         self.roundings = {1: 0, 0.1: 1, 0.01: 2}        
         assert lot > 0 and max_holding > 0
         assert tick in self.roundings
@@ -22,14 +26,25 @@ class StockExchange(object):
         self.lot = lot
         self.tick = tick
         self.max_holding = max_holding
-        self.traders = set()
+        self.traders = []
         self.prev_price = None
         self.curr_price = round(stock.price, self.roundings[tick])
+        assert block is None or block > 0
+        self.block = block
+        self._buffer = []
+        self._cursor = 0
+
+    @property
+    def buffered(self):
+        ''' int: number of future prices already simulated but not reached yet, during which the stock runs ahead
+        '''
+        return len(self._buffer) - self._cursor
     
     def register_trader(self, trader):
         ''' Register a trader
         '''
-        self.traders.add(trader)
+        if trader not in self.traders:
+            self.traders.append(trader)
 
     def reset_episode(self):
         ''' Reset at the beginning of an episode
@@ -38,6 +53,15 @@ class StockExchange(object):
         for trader in self.traders:
             trader.reset_episode()
 
+    def sync_price(self):
+        ''' Restart from the current price of the stock, e.g. after the stock was rewound or moved externally
+        Drops any buffered future prices
+        '''
+        self.prev_price = None
+        self.curr_price = round(self.stock.price, self.roundings[self.tick])
+        self._buffer = []
+        self._cursor = 0
+
     def execute(self, order: int):
         ''' Execute an order from a particular trader
         Args:
@@ -49,6 +73,30 @@ class StockExchange(object):
         spread_cost = num_lots * self.tick
         impact_cost = num_lots**2 * self.tick
         return spread_cost + impact_cost
+
+    def execute_orders(self, holdings: np.ndarray, orders: np.ndarray, net=False):
+        ''' Execute the orders of all traders in a step at once, adjusting them to max_holding
+        Without netting, the cost of each order is the same as that of execute.
+        With netting, buy and sell orders cross each other first, and only the residual imbalance reaches the market:
+        every order still pays the spread on all of its lots, but the impact is charged on its pro-rata share of the
+        residual, i.e. orders on the side of the imbalance share it in proportion to their size, the others pay none
+        Args:
+            holdings (np.ndarray): the number of shares in holding of each trader
+            orders (np.ndarray): how many shares each trader buys (positive) or sells (negative)
+            net (bool): True to net opposing orders before impact costs are charged
+        Returns:
+            np.ndarray: the orders adjusted to max_holding
+            np.ndarray: the transaction cost of each trader
+        '''
+        orders = np.clip(holdings + orders, -self.max_holding, self.max_holding) - holdings
+        num_lots = np.abs(orders) / self.lot
+        impact_lots = num_lots
+        if net:
+            buy, sell = orders[orders > 0].sum(), -orders[orders < 0].sum()
+            dominant = orders > 0 if buy >= sell else orders < 0
+            share = abs(buy - sell) / max(buy, sell) if max(buy, sell) > 0 else 0.0
+            impact_lots = np.where(dominant, num_lots * share, 0.0)
+        return orders, num_lots * self.tick + impact_lots**2 * self.tick
     
     def notify_traders(self, old_price: float, new_price: float):
         ''' Notify observers of new simulated stock price
@@ -59,6 +107,110 @@ class StockExchange(object):
     def simulate_stock_price(self):
         ''' Simulate the internal stock for one time step
         '''
+        self.advance_price()
+        self.notify_traders(self.prev_price, self.curr_price)
+
+    def advance_price(self):
+        ''' Simulate the internal stock for one time step without notifying the traders, e.g. to update them in bulk
+        '''
+        self.prev_price = self.curr_price
+        if self.block is None:
+            self.curr_price = round(self.stock.simulate_price(), self.roundings[self.tick])
+        else:
+            # the stock runs up to one block ahead of the exchange, refill the buffer once it is consumed
+            if self._cursor == len(self._buffer):
+                self._buffer = np.round(self.stock.simulate_path(self.block), self.roundings[self.tick]).tolist()
+                self._cursor = 0
+            self.curr_price = self._buffer[self._cursor]
+            self._cursor += 1
+
+class MultiAssetExchange(object):
+    ''' An exchange referencing several stocks simulated together, e.g. CorrelatedOULogStocks, and a list of traders
+    Every per-stock setting is an array, so orders, holding limits and transaction costs of all stocks are one call.
+    The cost of an order of each stock follows StockExchange.execute with the lot and tick of that stock
+    Attributes:
+        stocks (CorrelatedOULogStocks): the stocks on this exchange
+        names (tuple): the name of each stock
+        lot (np.ndarray): the lot size of each stock
+        tick (np.ndarray): the tick size of each stock
+        max_holding (np.ndarray): the max number of shares of each stock a trader can long or short in cumulative
+        traders (list): the instances of MultiAssetStockTrader, in order of registration
+        prev_price (np.ndarray): the one-step previous price of each stock rounded to its tick
+        curr_price (np.ndarray): the current price of each stock rounded to its tick
+        roundings (dict): for convenience in rounding price to tick
+    '''
+    def __init__(self, stocks, lot, tick, max_holding, names=None):
+        ''' Args:
+            lot, tick, max_holding: an array with one value per stock, or a value shared by all stocks
+            names (tuple): the name of each stock, default to stock 0, stock 1, ...
+        '''
+        self.roundings = {1: 0, 0.1: 1, 0.01: 2}
+        n = len(stocks)
+        self.stocks = stocks
+        self.names = tuple(names) if names is not None else tuple('stock {}'.format(i) for i in range(n))
+        assert len(self.names) == n
+        self.lot = np.broadcast_to(np.asarray(lot, dtype=np.int64), (n,)).copy()
+        self.tick = np.broadcast_to(np.asarray(tick, dtype=float), (n,)).copy()
+        self.max_holding = np.broadcast_to(np.asarray(max_holding, dtype=np.int64), (n,)).copy()
+        assert (self.lot > 0).all() and (self.max_holding > 0).all()
+        assert all(tick in self.roundings for tick in self.tick.tolist())
+        # round each group of stocks sharing a number of digits in one call
+        digits = np.array([self.roundings[tick] for tick in self.tick.tolist()])
+        self._digit_groups = [(d, np.flatnonzero(digits == d)) for d in np.unique(digits).tolist()]
+        self.traders = []
+        self.prev_price = None
+        self.curr_price = self._round(stocks.price)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _round(self, price: np.ndarray):
+        rounded = np.empty(len(price))
+        for digits, index in self._digit_groups:
+            rounded[index] = np.round(price[index], digits)
+        return rounded
+
+    def register_trader(self, trader):
+        ''' Register a trader
+        '''
+        self.traders.append(trader)
+
+    def reset_episode(self):
+        ''' Reset at the beginning of an episode
+        '''
+        self.prev_price = None
+        for trader in self.traders:
+            trader.reset_episode()
+
+    def clip_orders(self, holding: np.ndarray, orders: np.ndarray):
+        ''' Adjust orders so that no holding goes beyond max_holding
+        Args:
+            holding (np.ndarray): the current holding of each stock
+            orders (np.ndarray): the number of shares of each stock to buy (positive) or sell (negative)
+        Returns:
+            np.ndarray: the adjusted orders
+        '''
+        return np.clip(holding + orders, -self.max_holding, self.max_holding) - holding
+
+    def execute(self, orders: np.ndarray):
+        ''' Execute the orders of a particular trader on all stocks
+        Args:
+            orders (np.ndarray): the number of shares of each stock to buy (positive) or sell (negative)
+        Returns:
+            np.ndarray: the transaction cost of each stock
+        '''
+        num_lots = np.abs(orders) / self.lot
+        return num_lots * self.tick + num_lots**2 * self.tick
+
+    def notify_traders(self, old_price: np.ndarray, new_price: np.ndarray):
+        ''' Notify observers of new simulated stock prices
+        '''
+        for trader in self.traders:
+            trader.get_updated_price(old_price, new_price)
+
+    def simulate_stock_price(self):
+        ''' Simulate all stocks for one time step
+        '''
         self.prev_price = self.curr_price
-        self.curr_price = round(self.stock.simulate_price(), self.roundings[self.tick])
-        self.notify_traders(self.prev_price, self.curr_price)
\ No newline at end of file
+        self.curr_price = self._round(self.stocks.simulate_price())
+        self.notify_traders(self.prev_price, self.curr_price)
@@ -0,0 +1,146 @@
+import cProfile
+import json
+import time
+
+# map each phase of a trading step to the object it is timed on and the name of the timed method
+PHASES = (
+    ('select_action', 'learner', '_find_action_greedily'),
+    ('train', 'learner', '_train_internally'),
+    ('refit', 'learner', '_refit'),
+    ('execute', 'exchange', 'execute'),
+    ('execute', 'exchange', 'execute_orders'),
+    ('simulate', 'exchange', 'simulate_stock_price'),
+    ('simulate', 'exchange', 'advance_price'),
+    ('notify', 'exchange', 'notify_traders'),
+)
+
+class Instrumentation(object):
+    ''' Per-phase cumulative timers and call counts for runs of StockTradingEnvironment
+    Timers are installed by wrapping the methods of PHASES on the exchange and the learners of its traders for the
+    duration of a run, and removed afterwards, so a run without instrumentation pays nothing.
+    Times are inclusive: simulate includes notify, and train includes any select_action it calls, e.g. in Q-learning.
+    A call nested in a call of the same phase is not counted again, e.g. advance_price within simulate_stock_price,
+    while in SynchronousStockTradingEnvironment, which calls advance_price alone, simulate times advance_price.
+    Attributes:
+        seconds (dict): map each phase to its cumulative wall-clock seconds
+        calls (dict): map each phase to its number of calls
+        q_sizes (dict): map each trader name to a list of (step, len(_Q)) sampled every sample_every steps
+        refit_durations (dict): map each trader name to the durations of the fits of its RefitScheduler
+        q_stats (dict): map each trader name to the stats of its Q store, for stores that keep stats e.g. BoundedQStore
+        steps (int): number of steps run while attached
+        run_seconds (float): wall-clock seconds of the runs while attached
+        sample_every (int): number of steps between two samples of len(_Q)
+        profile_window (tuple): (first step, last step) of a run to profile with cProfile, None to not profile
+        profile_path (str): where to dump the cProfile stats of the window
+    '''
+    def __init__(self, sample_every=1000, profile_window=None, profile_path='trading.prof'):
+        assert sample_every > 0
+        assert profile_window is None or 0 < profile_window[0] <= profile_window[1]
+        self.seconds = {phase: 0.0 for phase, _, _ in PHASES}
+        self.calls = {phase: 0 for phase, _, _ in PHASES}
+        self.q_sizes = dict()
+        self.refit_durations = dict()
+        self.q_stats = dict()
+        self.steps = 0
+        self.run_seconds = 0.0
+        self.sample_every = sample_every
+        self.profile_window = profile_window
+        self.profile_path = profile_path
+        self._wrapped = []
+        self._traders = []
+        self._active = set()
+        self._profiler = None
+        self._start = None
+
+    def _timed(self, phase: str, method):
+        seconds, calls, active = self.seconds, self.calls, self._active
+        def timed(*args, **kwargs):
+            if phase in active:
+                return method(*args, **kwargs)
+            active.add(phase)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[phase] += time.perf_counter() - start
+                calls[phase] += 1
+                active.discard(phase)
+        return timed
+
+    def attach(self, exchange, traders: list):
+        ''' Install the timers on the exchange and the learners of the traders
+        '''
+        self._traders = traders
+        targets = {'exchange': [exchange], 'learner': [trader.learner for trader in traders]}
+        for phase, target, name in PHASES:
+            for obj in targets[target]:
+                if hasattr(obj, name):
+                    setattr(obj, name, self._timed(phase, getattr(obj, name)))
+                    self._wrapped.append((obj, name))
+        for trader in traders:
+            self.q_sizes.setdefault(trader.name, [])
+        if self.profile_window is not None and self.profile_window[0] == 1:
+            self._start_profiler()
+        self._start = time.perf_counter()
+
+    def detach(self):
+        ''' Remove the timers, stop any profiling and collect the refit durations
+        '''
+        for obj, name in self._wrapped:
+            delattr(obj, name)
+        self._wrapped = []
+        self.run_seconds += time.perf_counter() - self._start
+        self._stop_profiler()
+        for trader in self._traders:
+            scheduler = getattr(trader.learner, 'scheduler', None)
+            if scheduler is not None:
+                self.refit_durations[trader.name] = list(scheduler.fit_durations)
+            stats = getattr(getattr(trader.learner, '_Q', None), 'stats', None)
+            if stats is not None:
+                self.q_stats[trader.name] = stats()
+
+    def on_step(self, step_count: int):
+        ''' Called by the environment at the end of every step
+        Args:
+            step_count (int): the step just completed, starting at 1
+        '''
+        self.steps += 1
+        if step_count % self.sample_every == 0:
+            for trader in self._traders:
+                self.q_sizes[trader.name].append((self.steps, len(getattr(trader.learner, '_Q', ()))))
+        if self.profile_window is not None:
+            first, last = self.profile_window
+            if step_count == first - 1:
+                self._start_profiler()
+            elif step_count == last:
+                self._stop_profiler()
+
+    def _start_profiler(self):
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def _stop_profiler(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            self._profiler = None
+
+    def summary(self):
+        ''' Returns:
+            dict: a machine-readable summary of all runs while attached
+        '''
+        return {
+            'steps': self.steps,
+            'run_seconds': self.run_seconds,
+            'steps_per_second': self.steps / self.run_seconds if self.run_seconds else None,
+            'phases': {phase: {'seconds': self.seconds[phase], 'calls': self.calls[phase]} for phase, _, _ in PHASES},
+            'q_sizes': self.q_sizes,
+            'refit_durations': self.refit_durations,
+            'q_stats': self.q_stats,
+        }
+
+    def dump(self, filename: str):
+        ''' Write the summary to a JSON file
+        '''
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
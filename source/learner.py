@@ -1,6 +1,7 @@
 import abc
-import random
-import operator
+import numpy as np
+from qtable import DenseQTable
+from rng import RandomStream
 
 class Learner(abc.ABC):
     ''' Abstract base class for a learning agent, either Q-learning or Sarsa
@@ -10,14 +11,25 @@ class Learner(abc.ABC):
         _count (int): number of learning steps it has done
         _last_action (object): the immediate previous action it took
         _last_state (tuple): to memorize the immediate previous state, for which it took _last_action
+        _random (RandomStream): the uniform values used by epsilon-greedy, seeded by seed
+        _td_error (float): the TD error of the last training step, None if the learner does not compute it
     '''
-    def __init__(self, actions: tuple, epsilon: float):
+    def __init__(self, actions: tuple, epsilon: float, seed=None):
         assert isinstance(actions, tuple) and (len(actions) > 0)
         self._actions = actions
         self._epsilon = epsilon
         self._count = 2 # to avoid divide by zero in log2(count)
         self._last_action = None
         self._last_state = None
+        self._random = RandomStream(seed)
+        self._td_error = None
+
+    def reseed(self, seed):
+        ''' Restart the random stream of this learner from a seed
+        Args:
+            seed (int): an int, a np.random.SeedSequence, or None for fresh entropy
+        '''
+        self._random = RandomStream(seed)
     
     @abc.abstractmethod
     def _find_action_greedily(self, state: tuple, use_epsilon=True, return_q=False):
@@ -53,19 +65,97 @@ class Learner(abc.ABC):
         self._last_action = None
         self._last_state = None
 
+    def _checkpoint(self):
+        ''' Collect the learning state to save in a checkpoint. Subclasses extend the result
+        Returns:
+            dict: map a name to a numpy array
+        '''
+        random_state, random_pending = self._random.get_state()
+        return {'actions': np.array(self._actions), 'count': np.array(self._count), 'epsilon': np.array(self._epsilon),
+            'random_state': random_state, 'random_pending': random_pending}
+
+    def _restore(self, arrays):
+        ''' Restore the learning state from the arrays of a checkpoint. Subclasses extend this
+        Args:
+            arrays (dict): map a name to a numpy array, as returned by _checkpoint
+        '''
+        assert tuple(arrays['actions'].tolist()) == self._actions, 'the checkpoint was saved with other actions'
+        self._count = int(arrays['count'])
+        self._epsilon = float(arrays['epsilon'])
+        if 'random_state' in arrays:
+            self._random.set_state(arrays['random_state'], arrays['random_pending'])
+
+    def save(self, filename: str):
+        ''' Save a checkpoint of the learning state to an uncompressed .npz file of flat arrays
+        Args:
+            filename (str): path of the file to write
+        '''
+        np.savez(filename, **self._checkpoint())
+
+    def load(self, filename: str):
+        ''' Warm-start from a checkpoint written by save, and reset the episode
+        The random stream resumes where it was saved, so the learner then acts as if it had never been interrupted
+        Args:
+            filename (str): path of the file to read
+        '''
+        with np.load(filename) as arrays:
+            self._restore(arrays)
+        self.reset_episode()
+
 class MatrixLearner(Learner):
     ''' Abstract base class for a Q-matrix or Sarsa-matrix
     Attributes:
-        _Q (dict): dict of key tuple (s,a) to the float value Q(s,a)
+        _Q (dict): dict of key tuple (s,a) to the float value Q(s,a), or a DenseQTable with the same interface
         _learning_rate (float): the constant learning_rate
         _discount_factor (float): the constant discount_factor of future rewards
     '''
-    def __init__(self, actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
-        super().__init__(actions, epsilon)
-        self._Q = dict()        
+    def __init__(self, actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, q_table=None,
+    seed=None):
+        super().__init__(actions, epsilon, seed)
+        self._Q = dict() if q_table is None else q_table
         self._learning_rate = learning_rate
         self._discount_factor = discount_factor
     
+    # Override
+    def _checkpoint(self):
+        arrays = super()._checkpoint()
+        if isinstance(self._Q, DenseQTable):
+            arrays['q_dense_values'] = self._Q.values
+            arrays['q_dense_visited'] = self._Q.visited
+        elif self._Q:
+            # parallel arrays: one column per state attribute, then the action and the value of each key (s,a)
+            keys, values = zip(*self._Q.items())
+            for i, column in enumerate(zip(*(key[0] for key in keys))):
+                arrays['q_state_{}'.format(i)] = np.array(column)
+            arrays['q_actions'] = np.array([key[1] for key in keys])
+            arrays['q_values'] = np.array(values, dtype=float)
+        return arrays
+
+    # Override
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        if 'q_dense_values' in arrays:
+            assert isinstance(self._Q, DenseQTable), 'the checkpoint holds a dense Q table'
+            np.copyto(self._Q.values, arrays['q_dense_values'])
+            np.copyto(self._Q.visited, arrays['q_dense_visited'])
+        elif isinstance(self._Q, dict):
+            self._Q = dict(self._checkpoint_entries(arrays))
+        else:
+            for key, value in self._checkpoint_entries(arrays):
+                self._Q[key] = value
+
+    @staticmethod
+    def _checkpoint_entries(arrays):
+        ''' Rebuild the keys (s,a) and values Q(s,a) saved as parallel arrays in a checkpoint
+        Returns:
+            iterator: pairs of key (s,a) and value Q(s,a)
+        '''
+        if 'q_actions' not in arrays:
+            return iter(())
+        ndim = sum(1 for name in arrays.files if name.startswith('q_state_'))
+        states = zip(*(arrays['q_state_{}'.format(i)].tolist() for i in range(ndim)))
+        return zip(zip(states, arrays['q_actions'].tolist()), arrays['q_values'].tolist())
+
     @abc.abstractmethod
     def _get_q(self, state, action):
         ''' Find, or estimate, Q(s,a) for a given state s and action a
@@ -77,22 +167,86 @@ class MatrixLearner(Learner):
         '''
         raise NotImplementedError
 
+    def _known_q(self, key, default=None):
+        ''' Find the stored value of a key (s,a), without counting an access in a store that counts them
+        Returns:
+            float: Q(s,a), default if the key is not stored
+        '''
+        peek = getattr(self._Q, 'peek', None)
+        return self._Q.get(key, default) if peek is None else peek(key, default)
+
+    def _touch(self, state, action):
+        ''' Count an access of (state, action) in a store that counts them, e.g. a BoundedQStore
+        '''
+        touch = getattr(self._Q, 'touch', None)
+        if touch is not None:
+            touch((state, action))
+
+    def _set_q(self, state, action, value: float):
+        ''' Store a new value of Q(s,a) for a given state s and action a
+        Args:
+            state (tuple): state s, a tuple of state attributes
+            action (object): action a
+            value (float): the new value of Q(s,a)
+        '''
+        self._Q[(state, action)] = value
+
+    def _get_q_row(self, state):
+        ''' Find, or estimate, Q(s,a) for a given state s and every action a in _actions
+        Subclasses with a vectorized storage or model should override this
+        Args:
+            state (tuple): state s, a tuple of state attributes
+        Returns:
+            np.ndarray: the values of Q(s,a) in the order of _actions
+        '''
+        return np.array([self._get_q(state, action) for action in self._actions], dtype=float)
+
+    def _get_q_rows(self, states: list):
+        ''' Find, or estimate, Q(s,a) for many states s and every action a in _actions
+        Subclasses with a vectorized storage or model should override this
+        Args:
+            states (list): list of states, each a tuple of state attributes
+        Returns:
+            np.ndarray: the values of Q(s,a) with shape (len(states), len(_actions))
+        '''
+        return np.array([self._get_q_row(state) for state in states], dtype=float).reshape(len(states), len(self._actions))
+
+    def greedy_actions(self, states: list, random: RandomStream):
+        ''' Find the greedy action of many states at once, without exploring, learning, or drawing from _random
+        This is the frozen policy of _find_action_greedily with use_epsilon=False
+        Args:
+            states (list): list of states, each a tuple of state attributes
+            random (RandomStream): uniform values to break ties among actions with Q of 0
+        Returns:
+            np.ndarray: the index in _actions of the greedy action of each state
+        '''
+        q_rows = self._get_q_rows(states)
+        best = np.argmax(q_rows, axis=1)
+        for i in np.flatnonzero(q_rows[np.arange(len(best)), best] == 0):
+            best[i] = random.choice(np.flatnonzero(q_rows[i] == 0))
+        return best
+
     # Override
     def _find_action_greedily(self, state, use_epsilon=True, return_q=False):
-        if use_epsilon and random.random() < self._epsilon:
+        if use_epsilon and self._random.next() < self._epsilon:
             # with probability epsilon, choose from all actions with equal chance
-            best_action = random.choice(self._actions)
+            best_action = self._random.choice(self._actions)
             max_q = None
             if return_q:
                 max_q = self._get_q(state, best_action)
         else:
             # choose action = arg max {action} of Q(state, action)
-            q_values = [(self._get_q(state, action), action) for action in self._actions]
-            max_q, best_action = max(q_values, key=operator.itemgetter(0))
+            q_row = self._get_q_row(state)
+            best_index = int(np.argmax(q_row))
+            max_q = float(q_row[best_index])
+            best_action = self._actions[best_index]
             # if max_q is 0, then either this state has never been visited
             # or the state has been visited but previous action results in negative reward
             if max_q == 0:
-                best_action = random.choice([pair[1] for pair in q_values if pair[0]==0])
+                best_action = self._actions[self._random.choice(np.flatnonzero(q_row == 0))]
+        if use_epsilon:
+            # the action taken is an access of (state, action), the candidates scored for it are not
+            self._touch(state, best_action)
         
         if return_q:
             return best_action, max_q
@@ -1,13 +1,13 @@
 import itertools
 from math import log
-import pandas as pd
-import matplotlib.pyplot as plt
 from stock import OULogStock
 from exchange import StockExchange
-from trader import *
-from environment import StockTradingEnvironment
+from environment import StockTradingEnvironment, print_progress
+from registry import create_trader, require
+from evaluation import evaluate_policy
 
-def graph_performance(df: pd.DataFrame, ntrain: int, version: int):
+def graph_performance(df: 'pd.DataFrame', ntrain: int, version: int):
+    plt = require('matplotlib.pyplot')
     linestyles = itertools.cycle(['-', ':', '--', '-.'])
     colors = itertools.cycle(['b', 'g', 'r', 'y', 'm', 'k', 'c'])
     plt.figure()
@@ -17,7 +17,7 @@ def graph_performance(df: pd.DataFrame, ntrain: int, version: int):
     plt.title('Performance with ntrain = {0:,} and ntest = {1:,}'.format(ntrain, ntest))
     plt.legend(loc='best')
     plt.xlabel('iterations in the test run')
-    plt.ylabel('cumulative wealth')
+    plt.ylabel('mean cumulative wealth of the frozen greedy policy')
     plt.tight_layout()
     plt.savefig('../figs/newfig{}.png'.format(version))
 
@@ -26,15 +26,17 @@ def run_stock_trading(version: int):
     lot = 10
     actions = tuple(range(-5*lot, 6*lot, lot))
     stock_exchange = StockExchange(oustock, lot, tick=0.1, max_holding=100*lot)
-    utility, ntrain, ntest = 1e-3, 5000, 1000
+    utility, ntrain, ntest, npaths = 1e-3, 5000, 1000, 200
     epsilon, learning_rate, discount_factor = 0.1, 0.5, 0.999
-    rf_sarsa = RFSarsaStockTrader('random forest sarsa', utility, stock_exchange, actions, epsilon, learning_rate, discount_factor)
-    tabular_qmatrix = TabularQMatrixStockTrader('tabular q-learning', utility, stock_exchange, actions, epsilon, learning_rate, discount_factor)
-    tabular_sarsa = TabularSarsaStockTrader('tabular sarsa', utility, stock_exchange, actions, epsilon, learning_rate, discount_factor)
+    traders = [create_trader(name, name, utility, stock_exchange, actions, epsilon, learning_rate, discount_factor)
+        for name in ('random forest sarsa', 'tabular q-learning', 'tabular sarsa')]
     trading_environment = StockTradingEnvironment(stock_exchange)
-    trading_environment.run(ntrain)
-    result = trading_environment.run(ntest, report=True)
-    result = pd.DataFrame(result)
+    trading_environment.run(ntrain, progress=print_progress)
+    # test the frozen greedy policies on the same npaths paths, without exploring or learning
+    pd = require('pandas')
+    stats = {trader.name: evaluate_policy(trader, npaths, ntest, seed=version, paths=True) for trader in traders}
+    print(pd.DataFrame({name: {k: v for k, v in s.items() if k != 'wealth'} for name, s in stats.items()}).T)
+    result = pd.DataFrame({name: s['wealth'].mean(axis=1) for name, s in stats.items()})
     result.sort_index(axis=1, inplace=True)
     graph_performance(result, ntrain, version)
 
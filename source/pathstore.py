@@ -0,0 +1,83 @@
+import numpy as np
+from stock import Stock
+from exchange import StockExchange
+
+def record_paths(exchange: StockExchange, filename: str, npaths: int, nsteps: int):
+    ''' Record tick-rounded price paths from exchange.simulate_stock_price into a memory-mapped .npy file
+    Row i holds the current price of the exchange followed by nsteps simulated prices, and path i+1 continues
+    from where path i ended. Traders registered on the exchange are notified as usual, so record on an exchange
+    without traders unless they are meant to trade along.
+    Args:
+        exchange (StockExchange): the exchange whose stock is simulated
+        filename (str): path of the .npy file to write
+        npaths (int): number of paths
+        nsteps (int): number of steps per path
+    Returns:
+        np.memmap: the recorded paths with shape (npaths, nsteps+1)
+    '''
+    assert npaths > 0 and nsteps > 0
+    paths = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float64, shape=(npaths, nsteps+1))
+    row = np.empty(nsteps+1)
+    for i in range(npaths):
+        row[0] = exchange.curr_price
+        for step in range(1, nsteps+1):
+            exchange.simulate_stock_price()
+            row[step] = exchange.curr_price
+        paths[i] = row
+    paths.flush()
+    return paths
+
+class ReplayStock(Stock):
+    ''' A stock that replays the price paths of a file written by record_paths, one path at a time
+    The file is memory-mapped read-only, so a path library larger than RAM can be shared by many processes.
+    After select_path, call StockExchange.sync_price so that the exchange starts from the new path.
+    Attributes:
+        paths (np.memmap): all recorded paths with shape (npaths, nsteps+1)
+        path (int): the index of the path being replayed
+        step (int): the index in the path of the current price
+    '''
+    def __init__(self, filename: str, maxp: float, minp=0, path=0):
+        self.paths = np.load(filename, mmap_mode='r')
+        assert self.paths.ndim == 2
+        self.maxp = maxp
+        self.minp = minp
+        self.select_path(path)
+
+    @property
+    def npaths(self):
+        return self.paths.shape[0]
+
+    @property
+    def nsteps(self):
+        return self.paths.shape[1] - 1
+
+    def select_path(self, path: int):
+        ''' Rewind to the first price of a path
+        Args:
+            path (int): the index of the path to replay
+        '''
+        assert 0 <= path < self.npaths
+        self.path = path
+        self.step = 0
+        self.price = float(self.paths[path, 0])
+        assert self.minp <= self.price <= self.maxp
+
+    # Override
+    def simulate_price(self, dt=1.0):
+        assert dt == 1.0, 'recorded paths have a time step of 1'
+        if self.step == self.nsteps:
+            raise IndexError('path {} has no more than {} steps'.format(self.path, self.nsteps))
+        self.step += 1
+        self.price = float(self.paths[self.path, self.step])
+        return self.price
+
+    # Override
+    def simulate_path(self, nsteps, dt=1.0):
+        assert dt == 1.0, 'recorded paths have a time step of 1'
+        if self.step + nsteps > self.nsteps:
+            raise IndexError('path {} has no more than {} steps'.format(self.path, self.nsteps))
+        # a read-only view into the memory map, no copy
+        path = self.paths[self.path, self.step+1:self.step+1+nsteps]
+        self.step += nsteps
+        self.price = float(path[-1])
+        return path
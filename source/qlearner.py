@@ -1,6 +1,7 @@
 import abc
 from math import log2
 from learner import Learner, MatrixLearner
+from qtable import DenseQTable
 
 # Adapted from:
 # github.com/vmayoral/basic_reinforcement_learning/blob/master/tutorial1/qlearn.py
@@ -43,13 +44,27 @@ class QMatrix(MatrixLearner, QLearner):
             return None
         old_q = self._get_q(self._last_state, self._last_action)
         _, max_q = self._find_action_greedily(new_state, use_epsilon=False, return_q=True)
-        new_q = old_q + self._learning_rate * (reward + self._discount_factor * max_q - old_q)
-        self._Q[(self._last_state, self._last_action)] = new_q
+        self._td_error = reward + self._discount_factor * max_q - old_q
+        new_q = old_q + self._learning_rate * self._td_error
+        self._set_q(self._last_state, self._last_action, new_q)
 
 class TabularQMatrix(QMatrix):
     ''' The discrete, tabular Q-matrix learner
+    Pass a DenseQTable as q_table to store Q in a numpy array instead of a dict
     '''
     # Override
     def _get_q(self, state, action):
-        return self._Q.get((state, action), 0)
+        return self._known_q((state, action), 0)
+
+    # Override
+    def _get_q_row(self, state):
+        if isinstance(self._Q, DenseQTable):
+            return self._Q.row(state)
+        return super()._get_q_row(state)
+
+    # Override
+    def _get_q_rows(self, states):
+        if isinstance(self._Q, DenseQTable):
+            return self._Q.rows(states)
+        return super()._get_q_rows(states)
     
\ No newline at end of file
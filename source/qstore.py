@@ -0,0 +1,200 @@
+import heapq
+import shelve
+from collections import OrderedDict
+
+class BoundedQStore(object):
+    ''' A capacity-bounded store of Q(s,a) with the dict interface of MatrixLearner._Q
+    Every access of a key by get, [], touch or an update counts as one visit, and as one hit or miss. peek and in
+    count nothing, so MatrixLearner scores candidate actions with peek and touches only the (s,a) it takes, and each
+    step then counts the chosen (s,a) and the updated (s,a) once each.
+    Once full, storing a new key evicts an entry chosen by policy:
+        lru: the least recently visited entry
+        lfu: the least visited entry, the least recently visited among ties
+    Evicted values can spill to an on-disk shelve, from which a later access promotes them back, but not a peek.
+    Attributes:
+        capacity (int): the max number of entries held in memory
+        policy (str): either lru or lfu
+        hits (int): number of accesses found in memory
+        misses (int): number of accesses not found in memory
+        spill_hits (int): number of misses found in the on-disk tier
+        evictions (int): number of entries evicted from memory
+        _entries (OrderedDict): map each key to the pair [value, visits], least recently visited first
+        _heap (list): heap of (visits, tick, key) for the lfu policy, with stale items skipped lazily
+        _spill (shelve.Shelf): the on-disk tier, None if evicted values are dropped
+        _evict_listeners (list): callables notified with the key of each evicted entry
+        _promote_listeners (list): callables notified with the key and value of each entry promoted from disk
+    '''
+    def __init__(self, capacity: int, policy='lru', spill_path=None):
+        assert capacity > 0
+        assert policy in ('lru', 'lfu')
+        self.capacity = capacity
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._heap = []
+        self._tick = 0
+        self._spill = shelve.open(spill_path, flag='n') if spill_path is not None else None
+        self._evict_listeners = []
+        self._promote_listeners = []
+
+    def add_evict_listener(self, listener):
+        ''' Register a callable notified with the key of each entry evicted from memory
+        '''
+        self._evict_listeners.append(listener)
+
+    def add_promote_listener(self, listener):
+        ''' Register a callable notified with the key and value of each entry promoted back from the on-disk tier
+        '''
+        self._promote_listeners.append(listener)
+
+    def _visit(self, key, entry):
+        entry[1] += 1
+        self._entries.move_to_end(key)
+        if self.policy == 'lfu':
+            self._tick += 1
+            heapq.heappush(self._heap, (entry[1], self._tick, key))
+            # rebuild once the stale items dominate, to keep the heap O(capacity)
+            if len(self._heap) > 4 * self.capacity:
+                self._heap = [(entry[1], i, key) for i, (key, entry) in enumerate(self._entries.items())]
+                heapq.heapify(self._heap)
+
+    def _evict(self):
+        if self.policy == 'lru':
+            key, entry = self._entries.popitem(last=False)
+        else:
+            while True:
+                visits, _, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] == visits:
+                    del self._entries[key]
+                    break
+        self.evictions += 1
+        if self._spill is not None:
+            self._spill[repr(key)] = entry
+        for listener in self._evict_listeners:
+            listener(key)
+
+    def _insert(self, key, entry):
+        if len(self._entries) >= self.capacity:
+            self._evict()
+        entry[1] -= 1
+        self._entries[key] = entry
+        self._visit(key, entry)
+
+    def _promote(self, key, entry):
+        self.spill_hits += 1
+        self._insert(key, entry)
+        for listener in self._promote_listeners:
+            listener(key, entry[0])
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._visit(key, entry)
+            return entry
+        self.misses += 1
+        if self._spill is not None:
+            entry = self._spill.pop(repr(key), None)
+            if entry is not None:
+                self._promote(key, entry)
+        return entry
+
+    def touch(self, key):
+        ''' Count an access of key, e.g. when its action is taken, without reading its value
+        '''
+        self._lookup(key)
+
+    def peek(self, key, default=None):
+        ''' Read the value of key from memory or the on-disk tier, without counting a visit or promoting it
+        '''
+        entry = self._entries.get(key)
+        if entry is None and self._spill is not None:
+            entry = self._spill.get(repr(key))
+        return default if entry is None else entry[0]
+
+    def get(self, key, default=None):
+        entry = self._lookup(key)
+        return default if entry is None else entry[0]
+
+    def __getitem__(self, key):
+        entry = self._lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry[0] = value
+            self._visit(key, entry)
+            return
+        self.misses += 1
+        entry = self._spill.pop(repr(key), None) if self._spill is not None else None
+        if entry is None:
+            self._insert(key, [value, 1])
+        else:
+            # promote the spilled entry with its visits, so no stale copy is left on disk
+            entry[0] = value
+            entry[1] += 1
+            self._promote(key, entry)
+
+    def __delitem__(self, key):
+        del self._entries[key]
+
+    def __contains__(self, key):
+        ''' Check whether key is held in memory, without counting a visit
+        '''
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def values(self):
+        return (entry[0] for entry in self._entries.values())
+
+    def items(self):
+        return ((key, entry[0]) for key, entry in self._entries.items())
+
+    def visits(self, key):
+        ''' Returns:
+            int: the number of visits of key held in memory, 0 if not held
+        '''
+        entry = self._entries.get(key)
+        return 0 if entry is None else entry[1]
+
+    @property
+    def hit_rate(self):
+        ''' float: the fraction of accesses found in memory
+        '''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        ''' Returns:
+            dict: the counters of this store
+        '''
+        return {'size': len(self._entries), 'capacity': self.capacity, 'policy': self.policy,
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate,
+            'spill_hits': self.spill_hits, 'evictions': self.evictions,
+            'spilled': len(self._spill) if self._spill is not None else 0}
+
+    def close(self):
+        ''' Close the on-disk tier
+        '''
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
@@ -0,0 +1,130 @@
+import numpy as np
+from functools import reduce
+from math import gcd
+
+class DenseQTable(object):
+    ''' A dense Q table backed by a numpy array indexed by (price tick index, holding index, action index)
+    It supports the same mapping interface as the dict of key tuple ((price, holding), action) used in MatrixLearner,
+    so it can replace that dict for state spaces that are bounded by the exchange
+    Attributes:
+        actions (tuple): the list of all possible actions, in the same order as the learner
+        minp (float): the lowest price in the table
+        tick (float): the price tick size
+        max_holding (int): the max number of shares that can be long or short
+        holding_step (int): holdings are always multiples of this step
+        values (np.ndarray): array of Q(s,a) with shape (nprice, nholding, naction), allocated unless given
+        visited (np.ndarray): boolean array, True if Q(s,a) has been set at least once, allocated unless given
+    '''
+    def __init__(self, actions: tuple, minp: float, maxp: float, tick: float, max_holding: int, dtype=np.float64,
+    values=None, visited=None):
+        assert isinstance(actions, tuple) and (len(actions) > 0)
+        assert 0 <= minp < maxp and tick > 0 and max_holding > 0
+        self.actions = actions
+        self.minp = minp
+        self.tick = tick
+        self.max_holding = max_holding
+        self.holding_step = reduce(gcd, [int(a) for a in actions], int(max_holding))
+        self._action_index = {action: i for i, action in enumerate(actions)}
+        shape = self.grid_shape(actions, minp, maxp, tick, max_holding)
+        self.values = np.zeros(shape, dtype=dtype) if values is None else values
+        self.visited = np.zeros(shape, dtype=bool) if visited is None else visited
+        assert self.values.shape == shape and self.visited.shape == shape
+
+    @staticmethod
+    def grid_shape(actions: tuple, minp: float, maxp: float, tick: float, max_holding: int):
+        ''' Find the shape of a table over this grid without allocating it
+        Returns:
+            tuple: (nprice, nholding, naction)
+        '''
+        holding_step = reduce(gcd, [int(a) for a in actions], int(max_holding))
+        return (int(round((maxp - minp) / tick)) + 1, 2 * max_holding // holding_step + 1, len(actions))
+
+    @classmethod
+    def from_exchange(cls, exchange, actions: tuple, dtype=np.float64):
+        ''' Size the table from the price range of the exchange's stock, its tick and max_holding
+        Args:
+            exchange (StockExchange): the exchange the learner trades on
+            actions (tuple): the list of all possible actions
+        Returns:
+            DenseQTable: an empty table
+        '''
+        return cls(actions, exchange.stock.minp, exchange.stock.maxp, exchange.tick, exchange.max_holding, dtype)
+
+    def price_index(self, price):
+        ''' Map a price rounded to tick, or an array of prices, to the first axis of values
+        '''
+        return np.rint((np.asarray(price) - self.minp) / self.tick).astype(np.intp)
+
+    def holding_index(self, holding):
+        ''' Map a holding, or an array of holdings, to the second axis of values
+        '''
+        return (np.asarray(holding) + self.max_holding) // self.holding_step
+
+    def _index(self, key):
+        (price, holding), action = key
+        return (int(round((price - self.minp) / self.tick)),
+            (holding + self.max_holding) // self.holding_step,
+            self._action_index[action])
+
+    def row(self, state: tuple):
+        ''' Find Q(state, a) for every action a, in the order of actions
+        Args:
+            state (tuple): the pair (price, holding)
+        Returns:
+            np.ndarray: a view of the Q values of this state
+        '''
+        price, holding = state
+        return self.values[int(round((price - self.minp) / self.tick)), (holding + self.max_holding) // self.holding_step]
+
+    def rows(self, states: list):
+        ''' Find Q(state, a) for every action a of many states at once
+        Args:
+            states (list): list of pairs (price, holding)
+        Returns:
+            np.ndarray: the Q values with shape (len(states), len(actions))
+        '''
+        prices, holdings = np.array(states).reshape(-1, 2).T
+        return self.values[self.price_index(prices), self.holding_index(holdings.astype(np.int64))]
+
+    def get(self, key, default=0):
+        index = self._index(key)
+        if self.visited[index]:
+            return self.values[index].item()
+        return default
+
+    def __getitem__(self, key):
+        index = self._index(key)
+        if not self.visited[index]:
+            raise KeyError(key)
+        return self.values[index].item()
+
+    def __setitem__(self, key, value):
+        index = self._index(key)
+        self.values[index] = value
+        self.visited[index] = True
+
+    def __contains__(self, key):
+        return bool(self.visited[self._index(key)])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.visited))
+
+    def __bool__(self):
+        return bool(self.visited.any())
+
+    def keys(self):
+        for i, j, k in zip(*np.nonzero(self.visited)):
+            price = round(self.minp + i * self.tick, 10)
+            holding = int(j) * self.holding_step - self.max_holding
+            yield ((price, holding), self.actions[k])
+
+    def __iter__(self):
+        return self.keys()
+
+    def items(self):
+        for key in self.keys():
+            yield key, self.values[self._index(key)].item()
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.visited.nbytes
@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from registry import require
+
+def _fit_model(model, X, Y):
+    ''' Fit the model to X, Y. Defined at module level so that a process pool can pickle it
+    Returns:
+        object: the fitted model
+        float: wall-clock seconds taken by the fit
+    '''
+    start = time.perf_counter()
+    model.fit(X, Y)
+    return model, time.perf_counter() - start
+
+class RefitScheduler(object):
+    ''' Decide when the model of an approximator learner is refitted, and run the fit inline or in the background
+    A refit is due once every interval learning steps, or once _Q has grown by growth entries since the last refit.
+    A background fit trains a fresh copy of the model on a snapshot of _Q while the old model keeps serving predictions.
+    The fitted copy is swapped in by the learner at its next step. At most one fit is in flight at any time.
+    Attributes:
+        interval (int): number of learning steps between two refits, None to only use growth
+        growth (int): number of new entries in _Q that triggers a refit, None to only use interval
+        background (str): None to fit inline, 'thread' or 'process' to fit in a background worker
+        generation (int): number of fitted models produced so far
+        fit_durations (list): wall-clock seconds of each completed fit
+        _last_size (int): size of _Q at the last refit
+        _executor (Executor): the background worker, created on first use
+        _future (Future): the fit in flight, None if there is none
+    '''
+    def __init__(self, interval=500, growth=None, background=None):
+        assert interval is not None or growth is not None
+        assert interval is None or interval > 0
+        assert growth is None or growth > 0
+        assert background in (None, 'thread', 'process')
+        self.interval = interval
+        self.growth = growth
+        self.background = background
+        self.generation = 0
+        self.fit_durations = []
+        self._last_size = 0
+        self._executor = None
+        self._future = None
+
+    def is_due(self, steps: int, size: int):
+        ''' Check whether a refit is due
+        Args:
+            steps (int): number of learning steps done so far
+            size (int): number of entries in _Q
+        Returns:
+            bool: True if a new fit should be started now
+        '''
+        if size == 0 or self._future is not None:
+            return False
+        if self.interval is not None and steps >= self.interval and steps % self.interval == 0:
+            return True
+        return self.growth is not None and size - self._last_size >= self.growth
+
+    def submit(self, model, X, Y):
+        ''' Start a refit on the snapshot X, Y
+        Args:
+            model (object): the model currently serving predictions
+            X (np.ndarray): features of the snapshot, not to be modified afterwards
+            Y (np.ndarray): targets of the snapshot, not to be modified afterwards
+        Returns:
+            object: the fitted model if the fit ran inline, else None
+        '''
+        self._last_size = len(Y)
+        if self.background is None:
+            model, seconds = _fit_model(model, X, Y)
+            self.fit_durations.append(seconds)
+            self.generation += 1
+            return model
+        if self._executor is None:
+            pool = ThreadPoolExecutor if self.background == 'thread' else ProcessPoolExecutor
+            self._executor = pool(max_workers=1)
+        self._future = self._executor.submit(_fit_model, require('sklearn.base').clone(model), X, Y)
+        return None
+
+    def poll(self, wait=False):
+        ''' Collect the model fitted in the background, if any
+        Args:
+            wait (bool): True to block until the fit in flight completes
+        Returns:
+            object: the newly fitted model, or None if no fit has completed
+        '''
+        if self._future is None or not (wait or self._future.done()):
+            return None
+        model, seconds = self._future.result()
+        self._future = None
+        self.fit_durations.append(seconds)
+        self.generation += 1
+        return model
+
+    def close(self):
+        ''' Stop the background worker
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._future = None
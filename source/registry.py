@@ -0,0 +1,75 @@
+import importlib
+
+# map each trader type to the 'module:class' defining it, so a process only imports the types it uses
+TRADERS = {
+    'tabular q-learning': 'trader:TabularQMatrixStockTrader',
+    'tabular sarsa': 'trader:TabularSarsaStockTrader',
+    'tabular sarsa lambda': 'trader:TabularSarsaLambdaStockTrader',
+    'tile coding sarsa': 'trader:TileCodingSarsaStockTrader',
+    'replay sarsa': 'trader:ReplaySarsaStockTrader',
+    'random forest sarsa': 'trader:RFSarsaStockTrader',
+    'gbm sarsa': 'trader:GbmSarsaStockTrader',
+    'svr sarsa': 'trader:SvrSarsaStockTrader',
+}
+
+# map each learner type to the 'module:class' defining it
+LEARNERS = {
+    'tabular q-learning': 'qlearner:TabularQMatrix',
+    'tabular sarsa': 'sarsa:TabularSarsaMatrix',
+    'tabular sarsa lambda': 'sarsa:TabularSarsaLambdaMatrix',
+    'tile coding sarsa': 'sarsa:TileCodingSarsaMatrix',
+    'replay sarsa': 'sarsa:ReplaySarsaMatrix',
+    'random forest sarsa': 'sarsa:RandomForestSarsaMatrix',
+    'gbm sarsa': 'sarsa:GbmSarsaMatrix',
+    'svr sarsa': 'sarsa:SvrSarsaMatrix',
+}
+
+# map each optional backend module to the package that provides it
+PACKAGES = {
+    'sklearn': 'scikit-learn',
+    'xgboost': 'xgboost',
+    'scipy': 'scipy',
+    'pandas': 'pandas',
+    'matplotlib': 'matplotlib',
+}
+
+def require(module: str):
+    ''' Import an optional backend on first use
+    Args:
+        module (str): the full module name, e.g. sklearn.ensemble
+    Returns:
+        module: the imported module
+    Raises:
+        ImportError: with the package to install if the backend is not available
+    '''
+    try:
+        return importlib.import_module(module)
+    except ImportError as error:
+        package = PACKAGES.get(module.split('.')[0], module.split('.')[0])
+        raise ImportError('{} is required for this feature but could not be imported ({}). '
+            'Install it with: pip install {}'.format(module, error, package)) from error
+
+def resolve(name: str, registry=TRADERS):
+    ''' Find the class registered under a name, importing its module on first use
+    Args:
+        name (str): a key of registry
+        registry (dict): either TRADERS or LEARNERS
+    Returns:
+        type: the registered class
+    '''
+    try:
+        path = registry[name]
+    except KeyError:
+        raise ValueError('unknown type {!r}, expected one of {}'.format(name, sorted(registry))) from None
+    module, cls = path.split(':')
+    return getattr(importlib.import_module(module), cls)
+
+def create_trader(name: str, *args, **kwargs):
+    ''' Construct a trader of a registered type, e.g. create_trader('tabular sarsa', name, utility, exchange, ...)
+    '''
+    return resolve(name, TRADERS)(*args, **kwargs)
+
+def create_learner(name: str, *args, **kwargs):
+    ''' Construct a learner of a registered type, e.g. create_learner('tabular sarsa', actions, epsilon, ...)
+    '''
+    return resolve(name, LEARNERS)(*args, **kwargs)
@@ -0,0 +1,81 @@
+import numpy as np
+
+# the arrays holding one field of every transition
+FIELDS = ('states', 'actions', 'rewards', 'next_states', 'next_actions')
+
+class ReplayBuffer(object):
+    ''' A fixed-capacity ring buffer of Sarsa transitions (s, a, r, s', a') in preallocated numpy arrays
+    Once full, each new transition overwrites the oldest one, so memory is fixed whatever the length of training
+    Attributes:
+        capacity (int): the max number of transitions kept
+        states (np.ndarray): s of each transition with shape (capacity, nstate)
+        actions (np.ndarray): a of each transition
+        rewards (np.ndarray): r of each transition
+        next_states (np.ndarray): s' of each transition with shape (capacity, nstate)
+        next_actions (np.ndarray): a' of each transition
+        _size (int): number of transitions stored
+        _cursor (int): the slot of the next transition
+    '''
+    def __init__(self, capacity: int, nstate: int, dtype=np.float64):
+        assert capacity > 0 and nstate > 0
+        self.capacity = capacity
+        self.states = np.empty((capacity, nstate), dtype=dtype)
+        self.actions = np.empty(capacity, dtype=dtype)
+        self.rewards = np.empty(capacity, dtype=dtype)
+        self.next_states = np.empty((capacity, nstate), dtype=dtype)
+        self.next_actions = np.empty(capacity, dtype=dtype)
+        self._size = 0
+        self._cursor = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        ''' int: bytes held by the preallocated arrays
+        '''
+        return sum(getattr(self, field).nbytes for field in FIELDS)
+
+    def add(self, state: tuple, action, reward: float, next_state: tuple, next_action):
+        ''' Store one transition, overwriting the oldest one if full
+        '''
+        i = self._cursor
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.next_actions[i] = next_action
+        self._cursor = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def sample(self, batch_size: int, rng: np.random.Generator):
+        ''' Draw a minibatch of stored transitions uniformly, with replacement
+        Returns:
+            tuple: arrays (states, actions, rewards, next_states, next_actions) of batch_size transitions
+        '''
+        assert self._size > 0
+        index = rng.integers(0, self._size, batch_size)
+        return (self.states[index], self.actions[index], self.rewards[index],
+            self.next_states[index], self.next_actions[index])
+
+    def _checkpoint(self):
+        ''' Returns:
+            dict: map replay_<field> to the stored transitions of each field, and replay_cursor to the next slot
+        '''
+        arrays = {'replay_' + field: getattr(self, field)[:self._size] for field in FIELDS}
+        arrays['replay_cursor'] = np.array(self._cursor)
+        return arrays
+
+    def _restore(self, arrays):
+        ''' Restore the transitions saved by _checkpoint into a buffer of the same capacity
+        '''
+        size = len(arrays['replay_rewards'])
+        assert size <= self.capacity, 'the checkpoint holds more transitions than the capacity'
+        for field in FIELDS:
+            getattr(self, field)[:size] = arrays['replay_' + field]
+        self._size = size
+        self._cursor = int(arrays['replay_cursor']) % self.capacity
+
+    def clear(self):
+        self._size = 0
+        self._cursor = 0
@@ -0,0 +1,129 @@
+import json
+import os
+import numpy as np
+
+# the trader attributes recorded at every step
+FIELDS = ('wealth', 'holding', 'reward', 'transaction_cost')
+
+class PerformanceReport(object):
+    ''' Preallocated performance over time of a list of traders, with one column per trader
+    A reward that is not yet known, i.e. None at the start of an episode, is recorded as nan
+    Attributes:
+        names (list): the name of the trader of each column
+        columns (dict): map each of FIELDS to its preallocated values with shape (capacity, len(names))
+        nrows (int): number of rows recorded so far
+    '''
+    def __init__(self, names: list, capacity: int, columns=None):
+        assert capacity >= 0
+        self.names = list(names)
+        if columns is None:
+            columns = {field: np.empty((capacity, len(self.names))) for field in FIELDS}
+        self.columns = columns
+        self.nrows = 0
+
+    @property
+    def capacity(self):
+        return len(self.columns[FIELDS[0]])
+
+    def __getitem__(self, field: str):
+        ''' View one field of all recorded rows
+        Args:
+            field (str): one of FIELDS
+        Returns:
+            np.ndarray: values with shape (nrows, len(names))
+        '''
+        return self.columns[field][:self.nrows]
+
+    def record(self, traders: list):
+        ''' Append one row with the current state of the traders, in the same order as names
+        '''
+        row = self.nrows
+        wealth, holding = self.columns['wealth'][row], self.columns['holding'][row]
+        reward, transaction_cost = self.columns['reward'][row], self.columns['transaction_cost'][row]
+        for j, trader in enumerate(traders):
+            wealth[j] = trader.wealth
+            holding[j] = trader.holding
+            reward[j] = np.nan if trader.reward is None else trader.reward
+            transaction_cost[j] = trader.transaction_cost
+        self.nrows += 1
+
+    def append(self, values: dict):
+        ''' Append one row given as arrays, e.g. for traders holding one value per stock
+        Args:
+            values (dict): map each of FIELDS to an array with one value per column
+        '''
+        for field in FIELDS:
+            self.columns[field][self.nrows] = values[field]
+        self.nrows += 1
+
+    def to_dict(self, field='wealth'):
+        ''' Returns:
+            dict: map the name of each trader to its column of field, e.g. to build a pandas DataFrame
+        '''
+        values = self[field]
+        return {name: values[:, j] for j, name in enumerate(self.names)}
+
+class ReportWriter(object):
+    ''' Stream the performance of a list of traders to disk, flushing a chunk of rows every chunk steps
+    The directory holds one raw float64 file per field, with rows of len(names) values appended chunk by chunk,
+    and a header.json with the names and the number of rows flushed. Read it back with load_report.
+    Attributes:
+        directory (str): where the files are written
+        names (list): the name of the trader of each column
+        nrows (int): number of rows flushed to disk so far
+        _chunk (PerformanceReport): the rows not flushed yet
+    '''
+    def __init__(self, directory: str, names: list, chunk=10000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.nrows = 0
+        self._chunk = PerformanceReport(names, chunk)
+        for field in FIELDS:
+            open(self._path(field), 'wb').close()
+        self._write_header()
+
+    @property
+    def names(self):
+        return self._chunk.names
+
+    def _path(self, field: str):
+        return os.path.join(self.directory, field + '.f64')
+
+    def _write_header(self):
+        with open(os.path.join(self.directory, 'header.json'), 'w') as f:
+            json.dump({'names': self._chunk.names, 'fields': FIELDS, 'nrows': self.nrows}, f)
+
+    def record(self, traders: list):
+        ''' Append one row with the current state of the traders, and flush if the chunk is full
+        '''
+        self._chunk.record(traders)
+        if self._chunk.nrows == self._chunk.capacity:
+            self.flush()
+
+    def flush(self):
+        ''' Append the rows not flushed yet to the files
+        '''
+        if self._chunk.nrows == 0:
+            return
+        for field in FIELDS:
+            with open(self._path(field), 'ab') as f:
+                f.write(self._chunk[field].tobytes())
+        self.nrows += self._chunk.nrows
+        self._chunk.nrows = 0
+        self._write_header()
+
+def load_report(directory: str):
+    ''' Memory-map a report streamed by ReportWriter
+    Args:
+        directory (str): where the files were written
+    Returns:
+        PerformanceReport: a read-only report backed by the files
+    '''
+    with open(os.path.join(directory, 'header.json')) as f:
+        header = json.load(f)
+    names, nrows = header['names'], header['nrows']
+    columns = {field: np.memmap(os.path.join(directory, field + '.f64'), dtype=np.float64, mode='r',
+        shape=(nrows, len(names))) if nrows else np.empty((0, len(names))) for field in FIELDS}
+    report = PerformanceReport(names, nrows, columns)
+    report.nrows = nrows
+    return report
@@ -0,0 +1,78 @@
+import json
+import numpy as np
+
+def replica_seeds(seed, n_replicas: int):
+    ''' Derive independent seeds for the stock and the learner of each replica from one seed
+    Args:
+        seed (int): the root seed, or None for fresh entropy
+        n_replicas (int): number of replicas
+    Returns:
+        list: a pair (stock seed, learner seed) of np.random.SeedSequence per replica
+    '''
+    return [tuple(child.spawn(2)) for child in np.random.SeedSequence(seed).spawn(n_replicas)]
+
+class RandomStream(object):
+    ''' A seeded stream of random values of one kind, pre-drawn in blocks from a numpy Generator
+    The values served are exactly the sequence the generator would produce one at a time, whatever the block size,
+    so a stream seeded like a replica of BatchStockTradingEnvironment serves the same values as that replica
+    Attributes:
+        generator (np.random.Generator): the source of the values
+        method (str): name of the Generator method that draws a block, e.g. random or standard_normal
+        block (int): number of values pre-drawn at a time
+        _buffer (list): pre-drawn values
+        _cursor (int): position in _buffer of the next value
+    '''
+    def __init__(self, seed=None, method='random', block=1024):
+        ''' Args:
+            seed (int): an int, a np.random.SeedSequence, or None for fresh entropy
+        '''
+        assert method in ('random', 'standard_normal') and block > 0
+        self.generator = np.random.default_rng(seed)
+        self.method = method
+        self.block = block
+        self._buffer = []
+        self._cursor = 0
+
+    def next(self):
+        ''' Returns:
+            float: the next value of the stream
+        '''
+        if self._cursor == len(self._buffer):
+            self._buffer = getattr(self.generator, self.method)(self.block).tolist()
+            self._cursor = 0
+        value = self._buffer[self._cursor]
+        self._cursor += 1
+        return value
+
+    def draw(self, n: int):
+        ''' Take the next n values of the stream at once
+        Returns:
+            np.ndarray: the n values in stream order
+        '''
+        taken = self._buffer[self._cursor:self._cursor + n]
+        self._cursor += len(taken)
+        if len(taken) == n:
+            return np.array(taken)
+        return np.concatenate((taken, getattr(self.generator, self.method)(n - len(taken))))
+
+    def get_state(self):
+        ''' Capture the position of the stream, e.g. to save it in a checkpoint
+        Returns:
+            np.ndarray: the state of the generator, as the bytes of its JSON encoding
+            np.ndarray: the values pre-drawn but not served yet
+        '''
+        state = json.dumps(self.generator.bit_generator.state).encode()
+        return np.frombuffer(state, dtype=np.uint8), np.array(self._buffer[self._cursor:], dtype=float)
+
+    def set_state(self, state: np.ndarray, pending: np.ndarray):
+        ''' Resume the stream at a position captured by get_state, so it serves the same values from there on
+        '''
+        self.generator.bit_generator.state = json.loads(state.tobytes().decode())
+        self._buffer = pending.tolist()
+        self._cursor = 0
+
+    def choice(self, seq):
+        ''' Pick one element of a non-empty sequence with equal chance, using one uniform value of the stream
+        '''
+        assert self.method == 'random'
+        return seq[int(self.next() * len(seq))]
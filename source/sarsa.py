@@ -1,10 +1,14 @@
 import abc
+import pickle
 from math import log2
 import numpy as np
 from learner import Learner, MatrixLearner
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.svm import SVR
-# from xgboost import XGBRegressor
+from qtable import DenseQTable
+from refit import RefitScheduler
+from training import TrainingMatrix
+from cache import PredictionCache
+from replay import ReplayBuffer
+from registry import require
 
 class SarsaLearner(Learner):
     ''' Abstract base class for a Sarsa learner (on policy)
@@ -41,83 +45,468 @@ class SarsaMatrix(MatrixLearner, SarsaLearner):
         if self._last_action is None or self._last_state is None:
             return None
         old_q = self._get_q(self._last_state, self._last_action)
-        new_q = old_q + self._learning_rate * (reward + self._discount_factor * next_q - old_q)
-        self._Q[(self._last_state, self._last_action)] = new_q
+        self._td_error = reward + self._discount_factor * next_q - old_q
+        new_q = old_q + self._learning_rate * self._td_error
+        self._set_q(self._last_state, self._last_action, new_q)
 
 class TabularSarsaMatrix(SarsaMatrix):
     ''' The discrete, tabular Sarsa-matrix learner
+    Pass a DenseQTable as q_table to store Q in a numpy array instead of a dict
     '''
     # Override
     def _get_q(self, state, action):
-        return self._Q.get((state, action), 0)
+        return self._known_q((state, action), 0)
 
-class RandomForestSarsaMatrix(SarsaMatrix):
-    ''' Use random forest on all existing values of Q(s,a) to estimate new Q(s,a)
-    The forest is refitted once every 500 steps to all of existing Q
+    # Override
+    def _get_q_row(self, state):
+        if isinstance(self._Q, DenseQTable):
+            return self._Q.row(state)
+        return super()._get_q_row(state)
+
+    # Override
+    def _get_q_rows(self, states):
+        if isinstance(self._Q, DenseQTable):
+            return self._Q.rows(states)
+        return super()._get_q_rows(states)
+
+class TabularSarsaLambdaMatrix(TabularSarsaMatrix):
+    ''' The tabular Sarsa(lambda) learner, which backs up each TD error to all recently visited (s,a) at once
+    Eligibility traces are kept sparse: only keys (s,a) whose trace is at least trace_threshold are stored, so the number
+    of entries updated per step is at most log(trace_threshold) / log(discount_factor * trace_decay) + 1
+    Attributes:
+        trace_decay (float): the constant lambda, with 0 for one-step Sarsa
+        trace_threshold (float): traces below this are pruned
+        replacing (bool): True to reset the trace of a visited (s,a) to 1, False to add 1 to it
+        _traces (dict): dict of key tuple (s,a) to its eligibility trace
     '''
-    def __init__(self, actions, epsilon, learning_rate, discount_factor, max_nfeatures=2):
-        super().__init__(actions, epsilon, learning_rate, discount_factor)
-        self.randomforest = RandomForestRegressor(
-            n_estimators=30, max_features=max_nfeatures,
-            min_samples_leaf=5, n_jobs=2)
-    
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, trace_decay=0.9, trace_threshold=0.01,
+    replacing=True, q_table=None, seed=None):
+        super().__init__(actions, epsilon, learning_rate, discount_factor, q_table, seed)
+        assert 0 <= trace_decay <= 1 and 0 < trace_threshold < 1
+        assert discount_factor * trace_decay < 1, 'traces would never decay below the threshold'
+        self.trace_decay = trace_decay
+        self.trace_threshold = trace_threshold
+        self.replacing = replacing
+        self._traces = dict()
+
+    # Override
+    def _train_internally(self, reward, next_q):
+        if self._last_action is None or self._last_state is None:
+            return None
+        last = (self._last_state, self._last_action)
+        delta = reward + self._discount_factor * next_q - self._get_q(self._last_state, self._last_action)
+        self._td_error = delta
+        if self.replacing:
+            self._traces[last] = 1.0
+        else:
+            self._traces[last] = self._traces.get(last, 0.0) + 1.0
+        decay = self._discount_factor * self.trace_decay
+        step = self._learning_rate * delta
+        pruned = []
+        for (state, action), trace in self._traces.items():
+            self._set_q(state, action, self._get_q(state, action) + step * trace)
+            trace *= decay
+            if trace < self.trace_threshold:
+                pruned.append((state, action))
+            else:
+                self._traces[(state, action)] = trace
+        for key in pruned:
+            del self._traces[key]
+
+    # Override
+    def reset_episode(self):
+        super().reset_episode()
+        self._traces.clear()
+
+class TileCodingSarsaMatrix(SarsaMatrix):
+    ''' Sarsa with a linear approximator of Q(s,a) over tile-coded features of the state, one weight vector per action
+    Each of ntilings grids, offset from one another, splits the box [low, high] into ntiles tiles per state attribute.
+    A state activates one tile per grid, and Q(s,a) is the sum of the weights of action a on the active tiles.
+    Each learning step is a semi-gradient update of those ntilings weights, so its cost is constant and _Q stays empty
+    Attributes:
+        weights (np.ndarray): the weights with shape (len(actions), ntilings * (ntiles+1)**len(low))
+        low (np.ndarray): the lower bound of each state attribute
+        high (np.ndarray): the upper bound of each state attribute, states outside the box are clipped to it
+        ntilings (int): number of offset grids
+        ntiles (int): number of tiles per state attribute in each grid
+    '''
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, low: tuple, high: tuple, ntilings=8, ntiles=16,
+    seed=None):
+        super().__init__(actions, epsilon, learning_rate, discount_factor, seed=seed)
+        assert len(low) == len(high) and ntilings > 0 and ntiles > 0
+        self.low = np.array(low, dtype=float)
+        self.high = np.array(high, dtype=float)
+        assert (self.low < self.high).all()
+        self.ntilings = ntilings
+        self.ntiles = ntiles
+        ndim = len(low)
+        # asymmetric offsets: grid k moves by k * (1, 3, 5, ...) / ntilings of a tile along each attribute
+        self._offsets = (np.arange(ntilings)[:, None] * (2 * np.arange(ndim) + 1) / ntilings) % 1
+        self._strides = (ntiles + 1) ** np.arange(ndim)
+        self._bases = np.arange(ntilings) * (ntiles + 1) ** ndim
+        self._scale = ntiles / (self.high - self.low)
+        self._action_index = {action: i for i, action in enumerate(actions)}
+        self.weights = np.zeros((len(actions), ntilings * (ntiles + 1) ** ndim))
+        self._memo = dict()
+
+    def _tiles(self, state):
+        ''' Find the index of the active tile of state in each grid
+        Returns:
+            np.ndarray: ntilings indices into the second axis of weights
+        '''
+        tiles = self._memo.get(state)
+        if tiles is None:
+            x = np.clip((np.array(state, dtype=float) - self.low) * self._scale, 0, self.ntiles)
+            tiles = self._bases + np.floor(x + self._offsets).astype(np.intp) @ self._strides
+            # a learning step looks up the new state then trains on the last one, so two entries are enough
+            if len(self._memo) >= 2:
+                self._memo.clear()
+            self._memo[state] = tiles
+        return tiles
+
     # Override
     def _get_q(self, state, action):
-        # in the first 500 training steps, do not estimate, just default to 0
-        if not self._Q:
-            return 0
-        if (state, action) in self._Q:
-            return self._Q[(state, action)]
-        if self._count - 2 < 500:
-            return 0
-        # refit the random forest once every 500 steps
-        if (self._count - 2) % 500 == 0:
-            # prepare training data
-            X, Y = [], []
-            for key, value in self._Q.items():
-                # key is a tuple of (s,a)
-                X.append([*key[0], key[1]])
-                Y.append(value)
-            X = np.array(X)
-            Y = np.array(Y)
-            self.randomforest.fit(X, Y)
-        # use the random forest to predict Q for this (state, action)
-        x = np.array([*state, action]).reshape(1, len(state)+1)
-        return np.asscalar(self.randomforest.predict(x))
-
-class GbmSarsaMatrix(SarsaMatrix):
-    ''' Use gradient boosting of trees on all existing values of Q(s,a) to estimate new Q(s,a)
-    The model is refitted once every 500 steps to all of existing Q
+        return self.weights[self._action_index[action], self._tiles(state)].sum()
+
+    # Override
+    def _get_q_row(self, state):
+        return self.weights[:, self._tiles(state)].sum(axis=1)
+
+    # Override
+    def _get_q_rows(self, states):
+        x = np.clip((np.array(states, dtype=float) - self.low) * self._scale, 0, self.ntiles)
+        tiles = self._bases + np.floor(x[:, None, :] + self._offsets).astype(np.intp) @ self._strides
+        return self.weights[:, tiles].sum(axis=2).T
+
+    # Override
+    def _train_internally(self, reward, next_q):
+        if self._last_action is None or self._last_state is None:
+            return None
+        tiles = self._tiles(self._last_state)
+        weights = self.weights[self._action_index[self._last_action]]
+        old_q = weights[tiles].sum()
+        self._td_error = reward + self._discount_factor * next_q - old_q
+        # the gradient of Q(s,a) is 1 on each active tile, so the step is split across the ntilings active weights
+        weights[tiles] += self._learning_rate / self.ntilings * self._td_error
+
+    # Override
+    def _checkpoint(self):
+        arrays = super()._checkpoint()
+        arrays['tile_weights'] = self.weights
+        return arrays
+
+    # Override
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        np.copyto(self.weights, arrays['tile_weights'])
+
+class ReplaySarsaMatrix(SarsaMatrix):
+    ''' Sarsa with an incrementally trained regressor of Q(s,a), fed minibatches of transitions from a replay buffer
+    Every update_every steps, once the buffer holds batch_size transitions, the model takes one partial_fit step on
+    a minibatch with targets r + discount_factor * Q(s',a') from the current model, so memory and compute per step
+    are bounded. The state s is mapped from the box [low, high] to x in [-1, 1], then expanded to the quadratic
+    basis [1, x, x_i * x_j for i <= j] placed in the block of features of action a, all other blocks being 0.
+    So even a linear model fits a separate quadratic of the state per action, and the greedy action depends on s
+    Attributes:
+        model (object): a regressor with the partial_fit and predict interface of scikit-learn
+        buffer (ReplayBuffer): the most recent capacity transitions
+        batch_size (int): number of transitions per minibatch
+        update_every (int): number of steps between two minibatch updates
+        low (np.ndarray): the lower bound of each state attribute
+        high (np.ndarray): the upper bound of each state attribute
+        _pending (tuple): the last (s, a, r), stored once the next action a' is known
+        _fitted (bool): True once the model has taken a partial_fit step
     '''
-    def __init__(self, actions, epsilon, learning_rate, discount_factor, n_trees=100):
-        super().__init__(actions, epsilon, learning_rate, discount_factor)
-        self.gbm = XGBRegressor(n_estimators=n_trees, n_jobs=2)
-    
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, low: tuple, high: tuple, model=None,
+    capacity=10000, batch_size=32, update_every=4, seed=None):
+        super().__init__(actions, epsilon, learning_rate, discount_factor, seed=seed)
+        assert len(low) == len(high) and batch_size > 0 and update_every > 0
+        self.low = np.array(low, dtype=float)
+        self.high = np.array(high, dtype=float)
+        assert (self.low < self.high).all()
+        if model is None:
+            model = require('sklearn.linear_model').SGDRegressor(learning_rate='constant', eta0=0.01 * learning_rate,
+                shuffle=False)
+        self.model = model
+        self.buffer = ReplayBuffer(capacity, len(low))
+        self.batch_size = batch_size
+        self.update_every = update_every
+        self._center = (self.high + self.low) / 2
+        self._halfwidth = (self.high - self.low) / 2
+        self._action_column = np.array(actions, dtype=float)
+        # map action values back to their index in actions, for the block of features of each action
+        self._action_order = np.argsort(self._action_column)
+        self._sorted_actions = self._action_column[self._action_order]
+        self._pairs = np.triu_indices(len(low))
+        self._pending = None
+        self._fitted = False
+
+    def _features(self, states: np.ndarray, actions: np.ndarray):
+        ''' Returns:
+            np.ndarray: the features with one row per pair of states and actions, the quadratic basis of the scaled
+                state in the block of the action
+        '''
+        x = (np.asarray(states, dtype=float) - self._center) / self._halfwidth
+        basis = np.column_stack((np.ones(len(x)), x, x[:, self._pairs[0]] * x[:, self._pairs[1]]))
+        index = self._action_order[np.searchsorted(self._sorted_actions, np.asarray(actions, dtype=float))]
+        features = np.zeros((len(x), len(self._actions), basis.shape[1]))
+        features[np.arange(len(x)), index] = basis
+        return features.reshape(len(x), -1)
+
     # Override
     def _get_q(self, state, action):
-        # in the first 500 training steps, do not estimate, just default to 0
-        if not self._Q:
+        if not self._fitted:
             return 0
-        if (state, action) in self._Q:
-            return self._Q[(state, action)]
-        if self._count - 2 < 500:
+        return self.model.predict(self._features(np.array([state], dtype=float), [action]))[0]
+
+    # Override
+    def _get_q_row(self, state):
+        if not self._fitted:
+            return np.zeros(len(self._actions))
+        states = np.repeat(np.array([state], dtype=float), len(self._actions), axis=0)
+        return self.model.predict(self._features(states, self._action_column))
+
+    # Override
+    def _get_q_rows(self, states):
+        if not self._fitted:
+            return np.zeros((len(states), len(self._actions)))
+        S = np.repeat(np.array(states, dtype=float), len(self._actions), axis=0)
+        A = np.tile(self._action_column, len(states))
+        return self.model.predict(self._features(S, A)).reshape(len(states), len(self._actions))
+
+    # Override
+    def _train_internally(self, reward, next_q):
+        if self._last_action is None or self._last_state is None:
+            return None
+        # the transition is complete once learn has chosen the next action
+        self._pending = (self._last_state, self._last_action, reward)
+
+    # Override
+    def learn(self, reward, new_state):
+        action = super().learn(reward, new_state)
+        if self._pending is not None:
+            self.buffer.add(*self._pending, new_state, action)
+            self._pending = None
+        if self._count % self.update_every == 0 and len(self.buffer) >= self.batch_size:
+            self._update()
+        return action
+
+    def _update(self):
+        ''' Take one partial_fit step on a minibatch drawn from the buffer
+        '''
+        states, actions, rewards, next_states, next_actions = self.buffer.sample(self.batch_size, self._random.generator)
+        targets = rewards
+        if self._fitted:
+            targets = rewards + self._discount_factor * self.model.predict(self._features(next_states, next_actions))
+        self.model.partial_fit(self._features(states, actions), targets)
+        self._fitted = True
+
+    # Override
+    def reset_episode(self):
+        super().reset_episode()
+        self._pending = None
+
+    # Override
+    def _checkpoint(self):
+        arrays = super()._checkpoint()
+        arrays.update(self.buffer._checkpoint())
+        if self._fitted:
+            arrays['model'] = np.frombuffer(pickle.dumps(self.model), dtype=np.uint8)
+        return arrays
+
+    # Override
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        if 'replay_rewards' in arrays:
+            self.buffer._restore(arrays)
+        if 'model' in arrays:
+            self.model = pickle.loads(arrays['model'].tobytes())
+            self._fitted = True
+
+class ApproximatorSarsaMatrix(SarsaMatrix):
+    ''' Abstract class for a Sarsa-matrix that fits a regression model on all existing values of Q(s,a) to estimate new Q(s,a)
+    By default the model is refitted inline once every 500 steps to all of existing Q
+    Attributes:
+        model (object): a regressor with the fit and predict interface of scikit-learn, the one serving predictions
+        scheduler (RefitScheduler): decides when to refit and whether the fit runs in the background
+        training (TrainingMatrix): all existing values of Q as rows [*s, a] -> Q(s,a), kept in step with _Q
+        cache (PredictionCache): recent predictions of the serving model, None if caching is disabled
+        _fitted (bool): True once a fitted model is serving predictions
+    Pass a BoundedQStore as q_table to bound both _Q and the training data, as its evicted keys leave the training matrix
+    '''
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, model, scheduler=None, cache_size=65536,
+    q_table=None, seed=None):
+        super().__init__(actions, epsilon, learning_rate, discount_factor, q_table, seed)
+        self.model = model
+        self.scheduler = RefitScheduler() if scheduler is None else scheduler
+        self.training = None
+        self.cache = PredictionCache(cache_size) if cache_size else None
+        self._fitted = False
+        if hasattr(self._Q, 'add_evict_listener'):
+            self._Q.add_evict_listener(self._forget)
+            self._Q.add_promote_listener(self._remember)
+        if seed is not None:
+            # also seed the random_state of a randomized model
+            self.reseed(seed)
+
+    # Override
+    def reseed(self, seed):
+        super().reseed(seed)
+        # randomized models, e.g. random forest, also draw their random_state from the seed
+        if 'random_state' in self.model.get_params():
+            self.model.set_params(random_state=int(self._random.generator.integers(2**31)))
+
+    def _forget(self, key):
+        ''' Drop the training row of a key (s,a) evicted from _Q
+        '''
+        if self.training is not None and key in self.training:
+            self.training.remove(key)
+
+    def _remember(self, key, value):
+        ''' Write back the training row of a key (s,a) promoted into _Q from the on-disk tier of a BoundedQStore
+        '''
+        state, action = key
+        if self.training is None:
+            self.training = TrainingMatrix(len(state) + 1)
+        self.training.set(key, [*state, action], value)
+
+    # Override
+    def _set_q(self, state, action, value):
+        super()._set_q(state, action, value)
+        self._remember((state, action), value)
+
+    def _training_data(self):
+        ''' Get all existing values of Q as training data
+        A fit in the background gets a copy, an inline fit gets views of the training matrix
+        Returns:
+            np.ndarray: features X, one row [*s, a] per key (s,a)
+            np.ndarray: targets Y, the values Q(s,a)
+        '''
+        if self.scheduler.background is None:
+            return self.training.X, self.training.Y
+        return self.training.X.copy(), self.training.Y.copy()
+
+    def _refit(self):
+        ''' Swap in a model fitted in the background, and start a new fit if one is due
+        Called once per learning step, so the model is refitted at most once per step
+        '''
+        model = self.scheduler.poll()
+        if model is None and self.scheduler.is_due(self._count - 2, len(self._Q)):
+            X, Y = self._training_data()
+            model = self.scheduler.submit(self.model, X, Y)
+        if model is not None:
+            self.model = model
+            self._fitted = True
+            if self.cache is not None:
+                self.cache.invalidate()
+
+    def _is_model_ready(self):
+        ''' Returns:
+            bool: True if the model can be used to estimate unknown Q(s,a)
+        '''
+        # until the first fit completes, do not estimate, just default to 0
+        return self._fitted and bool(self._Q)
+
+    # Override
+    def learn(self, reward, new_state):
+        self._refit()
+        return super().learn(reward, new_state)
+
+    # Override
+    def _checkpoint(self):
+        arrays = super()._checkpoint()
+        if self._fitted:
+            arrays['model'] = np.frombuffer(pickle.dumps(self.model), dtype=np.uint8)
+        return arrays
+
+    # Override
+    def _restore(self, arrays):
+        super()._restore(arrays)
+        if 'q_actions' in arrays:
+            ndim = sum(1 for name in arrays.files if name.startswith('q_state_'))
+            self.training = TrainingMatrix(ndim + 1)
+            if isinstance(self._Q, dict):
+                columns = [arrays['q_state_{}'.format(i)] for i in range(ndim)] + [arrays['q_actions']]
+                self.training.assign(list(self._Q.keys()), np.column_stack(columns).astype(float), arrays['q_values'])
+            else:
+                # a bounded store may have evicted some of the entries while restoring, so rebuild from what it kept
+                for (state, action), value in list(self._Q.items()):
+                    self.training.set((state, action), [*state, action], value)
+        if 'model' in arrays:
+            self.model = pickle.loads(arrays['model'].tobytes())
+            self._fitted = True
+            if self.cache is not None:
+                self.cache.invalidate()
+
+    # Override
+    def _get_q(self, state, action):
+        value = self._known_q((state, action))
+        if value is not None:
+            return value
+        if not self._is_model_ready():
             return 0
-        # refit the GBM once every 500 steps
-        if (self._count - 2) % 500 == 0:
-            # prepare training data
-            X, Y = [], []
-            for key, value in self._Q.items():
-                # key is a tuple of (s,a)
-                X.append([*key[0], key[1]])
-                Y.append(value)
-            X = np.array(X)
-            Y = np.array(Y)
-            self.gbm.fit(X, Y)
-        # use the GBM to predict Q for this (state, action)
-        x = np.array([*state, action]).reshape(1, len(state)+1)
-        return np.asscalar(self.gbm.predict(x))
-
-class SvrSarsaMatrix(SarsaMatrix):
+        return self.predict_q([state], (action,))[0, 0]
+
+    # Override
+    def _get_q_row(self, state):
+        return self.predict_q([state])[0]
+
+    # Override
+    def _get_q_rows(self, states):
+        return self.predict_q(states)
+
+    def predict_q(self, states: list, actions=None):
+        ''' Estimate Q(s,a) for many states s and actions a with a single call to model.predict
+        Pairs (s,a) that are already known keep their stored value in _Q, and cached predictions are reused
+        Stored values are read with _known_q, so scoring candidate actions neither visits nor promotes them
+        Args:
+            states (list): list of states, each a tuple of state attributes
+            actions (tuple): the actions to evaluate, default to all of _actions
+        Returns:
+            np.ndarray: the values of Q(s,a) with shape (len(states), len(actions))
+        '''
+        actions = self._actions if actions is None else actions
+        q_values = np.zeros((len(states), len(actions)))
+        unknown = np.ones(q_values.shape, dtype=bool)
+        use_model = self._is_model_ready()
+        for i, state in enumerate(states):
+            for j, action in enumerate(actions):
+                value = self._known_q((state, action))
+                if value is None and use_model and self.cache is not None:
+                    value = self.cache.get((state, action))
+                if value is not None:
+                    q_values[i, j] = value
+                    unknown[i, j] = False
+        if unknown.any() and use_model:
+            S = np.array(states, dtype=float)
+            X = np.column_stack((np.repeat(S, len(actions), axis=0), np.tile(np.array(actions, dtype=float), len(states))))
+            q_values[unknown] = self.model.predict(X[unknown.ravel()])
+            if self.cache is not None:
+                for i, j in zip(*np.nonzero(unknown)):
+                    self.cache.put((states[i], actions[j]), q_values[i, j].item())
+        return q_values
+
+class RandomForestSarsaMatrix(ApproximatorSarsaMatrix):
+    ''' Use random forest on all existing values of Q(s,a) to estimate new Q(s,a)
+    The forest is refitted once every 500 steps to all of existing Q
+    '''
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, max_nfeatures=2, scheduler=None, cache_size=65536,
+    q_table=None, seed=None):
+        super().__init__(actions, epsilon, learning_rate, discount_factor, require('sklearn.ensemble').RandomForestRegressor(
+            n_estimators=30, max_features=max_nfeatures,
+            min_samples_leaf=5, n_jobs=2), scheduler, cache_size, q_table, seed)
+
+class GbmSarsaMatrix(ApproximatorSarsaMatrix):
+    ''' Use gradient boosting of trees on all existing values of Q(s,a) to estimate new Q(s,a)
+    The model is refitted once every 500 steps to all of existing Q
+    '''
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, n_trees=100, scheduler=None, cache_size=65536,
+    q_table=None, seed=None):
+        XGBRegressor = require('xgboost').XGBRegressor
+        super().__init__(actions, epsilon, learning_rate, discount_factor, XGBRegressor(n_estimators=n_trees, n_jobs=2),
+            scheduler, cache_size, q_table, seed)
+
+class SvrSarsaMatrix(ApproximatorSarsaMatrix):
     ''' Use support vector regression of trees on all existing values of Q(s,a) to estimate new Q(s,a)
     The model is refitted once every 500 steps to all of existing Q
     Args:
@@ -125,31 +514,9 @@ class SvrSarsaMatrix(SarsaMatrix):
         gamma (float): Kernel coefficient for ‘rbf’, ‘poly’ and ‘sigmoid’. If gamma is ‘auto’ then 1/n_features will be used.
         C (float): penalty parameter C of the error term.
     '''
-    def __init__(self, actions, epsilon, learning_rate, discount_factor, kernel='rbf', gamma='auto', C=1.0):
+    def __init__(self, actions, epsilon, learning_rate, discount_factor, kernel='rbf', gamma='auto', C=1.0,
+    scheduler=None, cache_size=65536, q_table=None, seed=None):
         assert kernel in ('rbf', 'sigmoid')
-        super().__init__(actions, epsilon, learning_rate, discount_factor)
-        self.svr = SVR(kernel=kernel, gamma=gamma, C=C)
-    
-    # Override
-    def _get_q(self, state, action):
-        # in the first 500 training steps, do not estimate, just default to 0
-        if not self._Q:
-            return 0
-        if (state, action) in self._Q:
-            return self._Q[(state, action)]
-        if self._count - 2 < 500:
-            return 0
-        # refit the GBM once every 500 steps
-        if (self._count - 2) % 500 == 0:
-            # prepare training data
-            X, Y = [], []
-            for key, value in self._Q.items():
-                # key is a tuple of (s,a)
-                X.append([*key[0], key[1]])
-                Y.append(value)
-            X = np.array(X)
-            Y = np.array(Y)
-            self.svr.fit(X, Y)
-        # use the GBM to predict Q for this (state, action)
-        x = np.array([*state, action]).reshape(1, len(state)+1)
-        return np.asscalar(self.svr.predict(x))
\ No newline at end of file
+        SVR = require('sklearn.svm').SVR
+        super().__init__(actions, epsilon, learning_rate, discount_factor, SVR(kernel=kernel, gamma=gamma, C=C),
+            scheduler, cache_size, q_table, seed)
\ No newline at end of file
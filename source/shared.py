@@ -0,0 +1,219 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+from qtable import DenseQTable
+from qlearner import TabularQMatrix
+from sarsa import TabularSarsaMatrix
+from rng import replica_seeds
+
+def _attach_block(name: str):
+    ''' Attach to an existing shared memory block created by the parent process
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13, workers share the resource tracker of the parent, which already tracks the block
+        return shared_memory.SharedMemory(name=name)
+
+class SharedQTable(object):
+    ''' A DenseQTable whose values and visited arrays live in multiprocessing.shared_memory
+    The creating process owns the blocks and must close and unlink them. Other processes attach with the picklable
+    spec, and all of them see a DenseQTable over the same memory. Updates are either lock-free (Hogwild) or guarded
+    by a lock per stripe of price rows, see StripeLocked
+    Attributes:
+        table (DenseQTable): the table over the shared arrays
+        spec (dict): everything another process needs to attach, passed to SharedQTable.attach
+        locks (list): the stripe locks, empty for lock-free updates
+        _blocks (list): the shared memory blocks of values and visited
+        _owner (bool): True in the process that created the blocks
+    '''
+    def __init__(self, spec: dict, blocks: list, locks: list, owner: bool):
+        self.spec = spec
+        self._blocks = blocks
+        self.locks = locks
+        self._owner = owner
+        shape = tuple(spec['shape'])
+        values = np.ndarray(shape, dtype=spec['dtype'], buffer=blocks[0].buf)
+        visited = np.ndarray(shape, dtype=bool, buffer=blocks[1].buf)
+        self.table = DenseQTable(spec['actions'], spec['minp'], spec['maxp'], spec['tick'], spec['max_holding'],
+            values=values, visited=visited)
+
+    @classmethod
+    def create(cls, actions: tuple, minp: float, maxp: float, tick: float, max_holding: int, dtype=np.float64,
+    nstripes=0, context=None):
+        ''' Allocate a zeroed table in shared memory
+        Args:
+            nstripes (int): number of stripe locks, 0 for lock-free updates
+            context (multiprocessing.context.BaseContext): the context the workers will be started with
+        Returns:
+            SharedQTable: the owner of the table
+        '''
+        context = multiprocessing.get_context() if context is None else context
+        shape = DenseQTable.grid_shape(actions, minp, maxp, tick, max_holding)
+        size = int(np.prod(shape))
+        blocks = [shared_memory.SharedMemory(create=True, size=max(size * np.dtype(dtype).itemsize, 1)),
+            shared_memory.SharedMemory(create=True, size=max(size, 1))]
+        spec = {'names': [block.name for block in blocks], 'shape': shape, 'dtype': np.dtype(dtype).str,
+            'actions': actions, 'minp': minp, 'maxp': maxp, 'tick': tick, 'max_holding': max_holding}
+        shared = cls(spec, blocks, [context.Lock() for _ in range(nstripes)], owner=True)
+        shared.table.values[...] = 0
+        shared.table.visited[...] = False
+        return shared
+
+    @classmethod
+    def from_exchange(cls, exchange, actions: tuple, dtype=np.float64, nstripes=0, context=None):
+        ''' Size the table from the price range of the exchange's stock, its tick and max_holding
+        '''
+        return cls.create(actions, exchange.stock.minp, exchange.stock.maxp, exchange.tick, exchange.max_holding,
+            dtype, nstripes, context)
+
+    @classmethod
+    def attach(cls, spec: dict, locks: list):
+        ''' Attach to a table created in another process
+        Args:
+            spec (dict): the spec of the owner
+            locks (list): the locks of the owner, inherited by the worker process
+        Returns:
+            SharedQTable: a view of the same table, not the owner
+        '''
+        return cls(spec, [_attach_block(name) for name in spec['names']], locks, owner=False)
+
+    def snapshot(self):
+        ''' Copy the table into private memory, e.g. to evaluate it while workers keep training
+        With stripe locks, all of them are held during the copy, so no update is half applied in the snapshot
+        Returns:
+            DenseQTable: a consistent copy
+        '''
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            values, visited = self.table.values.copy(), self.table.visited.copy()
+        finally:
+            for lock in reversed(self.locks):
+                lock.release()
+        table = self.table
+        return DenseQTable(table.actions, table.minp, self.spec['maxp'], table.tick, table.max_holding,
+            values=values, visited=visited)
+
+    def close(self):
+        ''' Release this process's view of the table, and free the shared memory if this process owns it
+        Any other reference to table or its arrays must be dropped first, a snapshot is safe to keep
+        '''
+        self.table = None
+        for block in self._blocks:
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = []
+
+class StripeLocked(object):
+    ''' Mixin for a tabular learner over a SharedQTable, that holds the stripe lock of the updated state while training
+    The lock of a state is chosen by its price row, so updates of states in different stripes run in parallel
+    Attributes:
+        _locks (list): the stripe locks of the shared table
+    '''
+    def __init__(self, *args, locks=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        assert isinstance(self._Q, DenseQTable) and len(locks) > 0
+        self._locks = list(locks)
+
+    def _lock(self, state: tuple):
+        return self._locks[int(round((state[0] - self._Q.minp) / self._Q.tick)) % len(self._locks)]
+
+    # Override
+    def _train_internally(self, reward, next_value):
+        if self._last_action is None or self._last_state is None:
+            return None
+        with self._lock(self._last_state):
+            return super()._train_internally(reward, next_value)
+
+class SharedTabularSarsaMatrix(StripeLocked, TabularSarsaMatrix):
+    ''' The tabular Sarsa-matrix learner with striped-lock updates of a SharedQTable
+    '''
+
+class SharedTabularQMatrix(StripeLocked, TabularQMatrix):
+    ''' The tabular Q-matrix learner with striped-lock updates of a SharedQTable
+    '''
+
+# map each learner of a parallel run to the classes of its lock-free and striped-lock variants
+PARALLEL_LEARNERS = {
+    'tabular sarsa': (TabularSarsaMatrix, SharedTabularSarsaMatrix),
+    'tabular q-learning': (TabularQMatrix, SharedTabularQMatrix),
+}
+
+def _train_actor(shared: SharedQTable, settings: dict, learner: str, nsteps: int, seeds: tuple, steps_done):
+    from stock import OULogStock
+    from exchange import StockExchange
+    from trader import StockTrader
+    from environment import StockTradingEnvironment
+    stock = OULogStock(settings['price'], settings['maxp'], settings['minp'], settings['kappa'], settings['mu'],
+        settings['sigma'], seed=seeds[0])
+    exchange = StockExchange(stock, settings['lot'], settings['tick'], settings['max_holding'])
+    trader = StockTrader('actor', settings['utility'], exchange)
+    lock_free, locked = PARALLEL_LEARNERS[learner]
+    args = (shared.spec['actions'], settings['epsilon'], settings['learning_rate'], settings['discount_factor'])
+    if shared.locks:
+        trader.learner = locked(*args, q_table=shared.table, seed=seeds[1], locks=shared.locks)
+    else:
+        trader.learner = lock_free(*args, q_table=shared.table, seed=seeds[1])
+    def progress(step_count, nrun):
+        with steps_done.get_lock():
+            steps_done.value += 1000
+    StockTradingEnvironment(exchange).run(nsteps, progress=progress)
+    with steps_done.get_lock():
+        steps_done.value += nsteps % 1000
+
+def _actor(spec: dict, locks: list, settings: dict, learner: str, nsteps: int, seeds: tuple, steps_done):
+    ''' Train one actor on its own stock paths against the shared table. Runs in a worker process
+    '''
+    shared = SharedQTable.attach(spec, locks)
+    try:
+        _train_actor(shared, settings, learner, nsteps, seeds, steps_done)
+    finally:
+        # the learner and its views of the shared arrays are gone once _train_actor returns
+        shared.close()
+
+def train_parallel(settings: dict, nworkers: int, nsteps: int, learner='tabular sarsa', nstripes=0, seed=None,
+progress=None):
+    ''' Train one tabular Q table with nworkers actor processes, each simulating its own stock paths
+    Args:
+        settings (dict): the stock, exchange and trader settings, with the keys of sweep.DEFAULTS
+        nworkers (int): number of actor processes
+        nsteps (int): number of steps of each actor
+        learner (str): a key of PARALLEL_LEARNERS
+        nstripes (int): number of stripe locks, 0 for lock-free (Hogwild) updates
+        seed (int): root seed, actor i is seeded with replica_seeds(seed)[i]
+        progress (callable): called with (total steps done, elapsed seconds) about once a second
+    Returns:
+        SharedQTable: the owner of the trained table, to snapshot and then close
+    '''
+    assert learner in PARALLEL_LEARNERS and nworkers > 0 and nsteps > 0
+    context = multiprocessing.get_context()
+    lot = settings['lot']
+    actions = tuple(range(-5*lot, 6*lot, lot))
+    shared = SharedQTable.create(actions, settings['minp'], settings['maxp'], settings['tick'],
+        settings['max_holding'], nstripes=nstripes, context=context)
+    steps_done = context.Value('q', 0)
+    workers = [context.Process(target=_actor, args=(shared.spec, shared.locks, settings, learner, nsteps, seeds,
+        steps_done)) for seeds in replica_seeds(seed, nworkers)]
+    start = time.perf_counter()
+    try:
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            wait([worker.sentinel for worker in workers if worker.is_alive()], timeout=1.0)
+            if progress is not None:
+                progress(steps_done.value, time.perf_counter() - start)
+        for worker in workers:
+            worker.join()
+        failed = [worker.exitcode for worker in workers if worker.exitcode != 0]
+        if failed:
+            raise RuntimeError('{} of {} actors failed with exit codes {}'.format(len(failed), nworkers, failed))
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        shared.close()
+        raise
+    return shared
@@ -1,6 +1,8 @@
 import abc
-import random
-from math import exp, log
+from math import exp, log, inf
+import numpy as np
+from registry import require
+from rng import RandomStream
 
 class Stock(abc.ABC):
     ''' Abstract base class for a stock object
@@ -8,14 +10,23 @@ class Stock(abc.ABC):
         price (float): the current spot price in USD
         maxp (float): the max price this stock can reach
         minp (float): the lowest price this stock can reach, subject to 0
+        _random (RandomStream): the standard normal shocks of the price model, seeded by seed
     '''
     
-    def __init__(self, price: float, maxp: float, minp: float):
+    def __init__(self, price: float, maxp: float, minp: float, seed=None):
         assert minp < price < maxp
         assert minp >= 0
         self.price = price
         self.maxp = maxp
         self.minp = minp
+        self._random = RandomStream(seed, 'standard_normal')
+
+    def reseed(self, seed):
+        ''' Restart the random stream of this stock from a seed
+        Args:
+            seed (int): an int, a np.random.SeedSequence, or None for fresh entropy
+        '''
+        self._random = RandomStream(seed, 'standard_normal')
 
     @abc.abstractmethod
     def simulate_price(self, dt=1.0):
@@ -27,26 +38,149 @@ class Stock(abc.ABC):
         '''
         raise NotImplementedError
 
+    def simulate_path(self, nsteps: int, dt=1.0):
+        ''' Simulate self.price over nsteps time steps of length dt at once
+        Subclasses with a vectorized model should override this
+        Args:
+            nsteps (int): number of time steps
+            dt (float): length of time step
+        Returns:
+            np.ndarray: the nsteps new prices, the last one being the updated self.price
+        '''
+        return np.array([self.simulate_price(dt) for _ in range(nsteps)])
+
 class OULogStock(Stock):
     ''' Stock with dlogS following an OU process
-    dlogS = kappa * (mu - logS) * dt + sigma * dW where var(dW) = dt    
+    dlogS = kappa * (mu - logS) * dt + sigma * dW where var(dW) = dt
+    The process is discretized either with the Euler scheme or with the exact OU transition:
+        euler: logS' = logS + kappa * (mu - logS) * dt + sigma * sqrt(dt) * Z
+        exact: logS' = mu + (logS - mu) * exp(-kappa * dt) + sigma * sqrt((1 - exp(-2 * kappa * dt)) / (2 * kappa)) * Z
+    Attributes:
+        scheme (str): either euler or exact
     '''
     def __init__(self, price: float, maxp: float, minp: float,
-    kappa: float, mu: float, sigma: float):
+    kappa: float, mu: float, sigma: float, scheme='euler', seed=None):
         assert kappa >= 0 and sigma >= 0
-        super().__init__(price, maxp, minp)
+        assert scheme in ('euler', 'exact')
+        super().__init__(price, maxp, minp, seed)
         self.kappa = kappa
         self.mu = mu
         self.sigma = sigma
-    
+        self.scheme = scheme
+
+    def _ar1_coefficients(self, dt: float):
+        ''' Write one step of the discretized log price as logS' = a * logS + b + c * Z
+        Returns:
+            tuple: the coefficients (a, b, c)
+        '''
+        if self.scheme == 'euler':
+            a = 1 - self.kappa * dt
+            c = self.sigma * dt**0.5
+        else:
+            a = exp(-self.kappa * dt)
+            c = self.sigma * ((1 - a * a) / (2 * self.kappa))**0.5 if self.kappa > 0 else self.sigma * dt**0.5
+        return a, self.mu * (1 - a), c
+
     # Override
     def simulate_price(self, dt=1.0):
         if self.price == 0:
             return 0
         old_log = log(self.price)
-        dW = dt**0.5 * random.gauss(0,1)
-        dlogS = self.kappa * (self.mu - old_log) * dt + self.sigma * dW
+        if self.scheme == 'euler':
+            dW = dt**0.5 * self._random.next()
+            dlogS = self.kappa * (self.mu - old_log) * dt + self.sigma * dW
+        else:
+            a, b, c = self._ar1_coefficients(dt)
+            dlogS = (a - 1) * old_log + b + c * self._random.next()
         self.price = self.price * exp(dlogS)
         self.price = max(self.price, self.minp)
         self.price = min(self.price, self.maxp)
-        return self.price
\ No newline at end of file
+        return self.price
+
+    # Override
+    def simulate_path(self, nsteps, dt=1.0):
+        if self.price == 0:
+            return np.zeros(nsteps)
+        lfilter = require('scipy.signal').lfilter
+        a, b, c = self._ar1_coefficients(dt)
+        shocks = b + c * self._random.draw(nsteps)
+        lower = log(self.minp) if self.minp > 0 else -inf
+        upper = log(self.maxp)
+        log_path = np.empty(nsteps)
+        old_log = log(self.price)
+        start, window = 0, 64
+        # run the linear recursion logS' = a * logS + shock in C over growing windows,
+        # and restart it right after any step where the price clamp binds
+        while start < nsteps:
+            end = min(start + window, nsteps)
+            segment, _ = lfilter([1.0], [1.0, -a], shocks[start:end], zi=[a * old_log])
+            clamped = np.flatnonzero((segment < lower) | (segment > upper))
+            if clamped.size == 0:
+                log_path[start:end] = segment
+                start, window = end, 2 * window
+            else:
+                k = clamped[0]
+                log_path[start:start+k] = segment[:k]
+                log_path[start+k] = min(max(segment[k], lower), upper)
+                start, window = start + k + 1, 64
+            old_log = log_path[start-1]
+        path = np.exp(log_path)
+        path[log_path <= lower] = self.minp
+        path[log_path >= upper] = self.maxp
+        self.price = float(path[-1])
+        return path
+
+class CorrelatedOULogStocks(object):
+    ''' Several stocks whose log prices follow correlated OU processes, simulated together in one numpy step
+    dlogS_i = kappa_i * (mu_i - logS_i) * dt + sigma_i * dW_i where corr(dW_i, dW_j) = correlation[i, j]
+    discretized with the Euler scheme as in OULogStock. The correlated shocks are L @ Z for the Cholesky factor L
+    Attributes:
+        price (np.ndarray): the current spot price of each stock
+        maxp (np.ndarray): the max price of each stock
+        minp (np.ndarray): the lowest price of each stock, subject to 0
+        kappa (np.ndarray): the mean reversion speed of each stock
+        mu (np.ndarray): the long run mean of the log price of each stock
+        sigma (np.ndarray): the volatility of the log price of each stock
+        cholesky (np.ndarray): the lower Cholesky factor of the correlation matrix
+        _random (RandomStream): the independent standard normal shocks, seeded by seed
+    '''
+    def __init__(self, price, maxp, minp, kappa, mu, sigma, correlation, seed=None):
+        ''' Args:
+            price, maxp, minp, kappa, mu, sigma: an array with one value per stock, or a float shared by all stocks
+            correlation (np.ndarray): the correlation matrix of the shocks, symmetric positive definite
+        '''
+        correlation = np.asarray(correlation, dtype=float)
+        n = len(correlation)
+        assert correlation.shape == (n, n) and np.allclose(correlation, correlation.T)
+        self.price, self.maxp, self.minp, self.kappa, self.mu, self.sigma = (
+            np.broadcast_to(np.asarray(x, dtype=float), (n,)).copy() for x in (price, maxp, minp, kappa, mu, sigma))
+        assert (self.minp < self.price).all() and (self.price < self.maxp).all() and (self.minp >= 0).all()
+        assert (self.kappa >= 0).all() and (self.sigma >= 0).all()
+        self.cholesky = np.linalg.cholesky(correlation)
+        self._lower = np.log(np.where(self.minp > 0, self.minp, 1.0))
+        self._lower[self.minp == 0] = -inf
+        self._upper = np.log(self.maxp)
+        self._random = RandomStream(seed, 'standard_normal')
+
+    def __len__(self):
+        return len(self.price)
+
+    def reseed(self, seed):
+        ''' Restart the random stream of these stocks from a seed
+        '''
+        self._random = RandomStream(seed, 'standard_normal')
+
+    def simulate_price(self, dt=1.0):
+        ''' Simulate the prices of all stocks over time step dt
+        Args:
+            dt (float): length of time step
+        Returns:
+            np.ndarray: the new updated price of each stock
+        '''
+        dW = dt**0.5 * (self.cholesky @ self._random.draw(len(self.price)))
+        with np.errstate(divide='ignore'):
+            log_price = np.log(self.price)
+        log_price = log_price + self.kappa * (self.mu - log_price) * dt + self.sigma * dW
+        # a stock at price 0 stays at 0, as in OULogStock
+        self.price = np.where(self.price == 0, 0.0, np.clip(np.exp(log_price), self.minp, self.maxp))
+        return self.price
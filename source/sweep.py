@@ -0,0 +1,118 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from math import log
+import numpy as np
+from stock import OULogStock
+from exchange import StockExchange
+from environment import StockTradingEnvironment
+from registry import TRADERS, create_trader, require
+from rng import replica_seeds
+
+# the simulation settings of main.run_stock_trading, used for any setting a trial does not override
+DEFAULTS = {
+    'price': 100, 'maxp': 500, 'minp': 0, 'kappa': 0.1, 'mu': log(150), 'sigma': 0.1,
+    'lot': 10, 'tick': 0.1, 'max_holding': 1000, 'ntrain': 5000, 'ntest': 1000,
+    'epsilon': 0.1, 'learning_rate': 0.5, 'discount_factor': 0.999, 'utility': 1e-3,
+    'trader': 'tabular sarsa',
+}
+
+def make_grid(seed=0, versions=range(12), **grid):
+    ''' Build the list of trials of a parameter sweep, one per version and combination of grid values
+    Each trial gets its own seed derived from the root seed and its position in the grid, so it is reproducible
+    Args:
+        seed (int): the root seed of the sweep
+        versions (iterable): the version numbers to repeat every combination for
+        grid (dict): map a setting in DEFAULTS to the sequence of values to sweep, e.g. epsilon=(0.05, 0.1)
+    Returns:
+        list: a dict of settings per trial
+    '''
+    unknown = set(grid) - set(DEFAULTS)
+    if unknown:
+        raise ValueError('unknown sweep settings: {}'.format(sorted(unknown)))
+    names = sorted(grid)
+    combos = list(itertools.product(versions, *(grid[name] for name in names)))
+    seeds = np.random.SeedSequence(seed).spawn(len(combos))
+    trials = []
+    for trial_id, (combo, child) in enumerate(zip(combos, seeds)):
+        trial = dict(DEFAULTS, trial_id=trial_id, version=combo[0], seed=int(child.generate_state(1)[0]))
+        trial.update(zip(names, combo[1:]))
+        trials.append(trial)
+    return trials
+
+def run_trial(trial: dict):
+    ''' Train then test one trader on a fresh stock and exchange. Runs in a worker process
+    Args:
+        trial (dict): the settings of this trial, as built by make_grid
+    Returns:
+        dict: the settings of this trial together with its test performance
+    '''
+    start = time.perf_counter()
+    # seeded like replica 0 of a BatchStockTradingEnvironment with the same seed
+    stock_seed, learner_seed = replica_seeds(trial['seed'], 1)[0]
+    stock = OULogStock(trial['price'], trial['maxp'], trial['minp'], trial['kappa'], trial['mu'], trial['sigma'],
+        seed=stock_seed)
+    exchange = StockExchange(stock, trial['lot'], trial['tick'], trial['max_holding'])
+    lot = trial['lot']
+    actions = tuple(range(-5*lot, 6*lot, lot))
+    trader = create_trader(trial['trader'], trial['trader'], trial['utility'], exchange, actions,
+        trial['epsilon'], trial['learning_rate'], trial['discount_factor'])
+    trader.learner.reseed(learner_seed)
+    environment = StockTradingEnvironment(exchange)
+    environment.run(trial['ntrain'])
+    wealth = environment.run(trial['ntest'], report=True)['wealth'][:, 0]
+    pnl = np.diff(wealth)
+    drawdown = np.maximum.accumulate(wealth) - wealth
+    return dict(trial, final_wealth=wealth[-1], mean_pnl=pnl.mean(), std_pnl=pnl.std(),
+        max_drawdown=drawdown.max(), seconds=time.perf_counter() - start)
+
+def run_sweep(trials: list, max_workers=None):
+    ''' Spread the trials across a pool of worker processes
+    Args:
+        trials (list): the settings of each trial
+        max_workers (int): number of worker processes, default to the number of cores
+    Returns:
+        generator: the result of each trial as soon as it finishes, in completion order
+    '''
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_trial, trial) for trial in trials]
+        for future in as_completed(futures):
+            yield future.result()
+
+def sweep_table(trials: list, max_workers=None, progress=None):
+    ''' Run a sweep and combine all results in one table
+    Args:
+        trials (list): the settings of each trial
+        max_workers (int): number of worker processes, default to the number of cores
+        progress (callable): called with (number of finished trials, result) as each trial finishes
+    Returns:
+        pd.DataFrame: one row per trial, ordered by trial_id
+    '''
+    pd = require('pandas')
+    results = []
+    for result in run_sweep(trials, max_workers):
+        results.append(result)
+        if progress is not None:
+            progress(len(results), result)
+    return pd.DataFrame(results).sort_values('trial_id').set_index('trial_id')
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the stock trading versions of main.py across a process pool')
+    parser.add_argument('--versions', type=int, default=12)
+    parser.add_argument('--traders', nargs='+', default=['random forest sarsa', 'tabular q-learning', 'tabular sarsa'],
+        choices=sorted(TRADERS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='sweep.csv')
+    args = parser.parse_args()
+    trials = make_grid(args.seed, range(args.versions), trader=args.traders)
+    def progress(finished, result):
+        print('finished {} of {} trials: version {} {} in {:.1f}s'.format(
+            finished, len(trials), result['version'], result['trader'], result['seconds']))
+    table = sweep_table(trials, args.workers, progress)
+    table.to_csv(args.output)
+    print(table.groupby('trader')['final_wealth'].describe())
+
+if __name__ == '__main__':
+    main()
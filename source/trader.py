@@ -1,7 +1,11 @@
 import abc
-from exchange import StockExchange
+import numpy as np
+from exchange import StockExchange, MultiAssetExchange
+from qtable import DenseQTable
+from qstore import BoundedQStore
 from qlearner import TabularQMatrix
-from sarsa import TabularSarsaMatrix, RandomForestSarsaMatrix, GbmSarsaMatrix, SvrSarsaMatrix
+from registry import create_learner
+from sarsa import TabularSarsaMatrix, TabularSarsaLambdaMatrix, TileCodingSarsaMatrix, ReplaySarsaMatrix, RandomForestSarsaMatrix, GbmSarsaMatrix, SvrSarsaMatrix
 
 class StockTrader(abc.ABC):
     ''' A stock trader that wraps a q-learning or sarsa learner inside
@@ -43,6 +47,13 @@ class StockTrader(abc.ABC):
         self.state = (self.exchange.curr_price, self.holding)
         self.learner.reset_episode()
 
+    def warm_start(self, filename: str):
+        ''' Load the internal learner from a checkpoint written by Learner.save, e.g. before StockTradingEnvironment.run
+        Args:
+            filename (str): path of the checkpoint file
+        '''
+        self.learner.load(filename)
+
     def get_updated_price(self, old_price: float, new_price: float):
         ''' Observe that the stock price on the exchange has moved
         Args:
@@ -56,55 +67,175 @@ class StockTrader(abc.ABC):
         self.reward = delta_wealth - 0.5 * self.utility * (delta_wealth - self.wealth / self.step_count)**2
         self.state = (new_price, self.holding)
     
+    def propose_order(self):
+        ''' Find an order from internal learner, not yet adjusted to exchange.max_holding
+        Returns:
+            int: how many shares to buy (positive) or sell (negative)
+        '''
+        return self.learner.learn(self.reward, self.state)
+
+    def fill_order(self, order: int, transaction_cost: float):
+        ''' Record an order executed by the exchange
+        Args:
+            order (int): the executed order, adjusted to exchange.max_holding
+            transaction_cost (float): the cost of the order
+        '''
+        self.transaction_cost = transaction_cost
+        self.holding += order
+
     def place_order(self):
         ''' Find an order from internal learner. Send this to exchange to execute.
         '''
-        order = self.learner.learn(self.reward, self.state)
+        order = self.propose_order()
         # adjust the order according to exchange.max_holding
         if self.holding + order > self.exchange.max_holding:
             order = self.exchange.max_holding - self.holding
         if self.holding + order < -self.exchange.max_holding:
             order = -self.exchange.max_holding - self.holding
 
-        self.transaction_cost = self.exchange.execute(order)
-        self.holding += order
+        self.fill_order(order, self.exchange.execute(order))
 
 class TabularQMatrixStockTrader(StockTrader):
     ''' A stock trader whose internal learner is tabular q-learning
+    Set dense to True to keep its Q table in a numpy array sized from the exchange,
+    or set q_capacity to keep at most that many entries, evicting by the eviction policy lru or lfu
     '''
     def __init__(self, name: str, utility: float, exchange: StockExchange,
-    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, dense=False,
+    q_capacity=None, eviction='lru'):
         super().__init__(name, utility, exchange)
-        self.learner = TabularQMatrix(actions, epsilon, learning_rate, discount_factor)
+        assert not (dense and q_capacity), 'a dense Q table is already bounded by the exchange'
+        q_table = None
+        if dense:
+            q_table = DenseQTable.from_exchange(exchange, actions)
+        elif q_capacity:
+            q_table = BoundedQStore(q_capacity, eviction)
+        self.learner = TabularQMatrix(actions, epsilon, learning_rate, discount_factor, q_table)
 
 class TabularSarsaStockTrader(StockTrader):
     ''' A stock trader whose internal learner is tabular sarsa
+    Set dense to True to keep its Q table in a numpy array sized from the exchange,
+    or set q_capacity to keep at most that many entries, evicting by the eviction policy lru or lfu
+    '''
+    def __init__(self, name: str, utility: float, exchange: StockExchange,
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, dense=False,
+    q_capacity=None, eviction='lru'):
+        super().__init__(name, utility, exchange)
+        assert not (dense and q_capacity), 'a dense Q table is already bounded by the exchange'
+        q_table = None
+        if dense:
+            q_table = DenseQTable.from_exchange(exchange, actions)
+        elif q_capacity:
+            q_table = BoundedQStore(q_capacity, eviction)
+        self.learner = TabularSarsaMatrix(actions, epsilon, learning_rate, discount_factor, q_table)
+
+class TabularSarsaLambdaStockTrader(StockTrader):
+    ''' A stock trader whose internal learner is tabular sarsa(lambda) with sparse eligibility traces
+    Set dense to True to keep its Q table in a numpy array sized from the exchange
+    '''
+    def __init__(self, name: str, utility: float, exchange: StockExchange,
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, trace_decay=0.9,
+    trace_threshold=0.01, dense=False):
+        super().__init__(name, utility, exchange)
+        q_table = DenseQTable.from_exchange(exchange, actions) if dense else None
+        self.learner = TabularSarsaLambdaMatrix(actions, epsilon, learning_rate, discount_factor, trace_decay,
+            trace_threshold, q_table=q_table)
+
+class TileCodingSarsaStockTrader(StockTrader):
+    ''' A stock trader whose internal learner is sarsa with a linear approximator over tile-coded (price, holding)
+    The tiles cover the price range of the exchange's stock and the holdings allowed by the exchange
     '''
     def __init__(self, name: str, utility: float, exchange: StockExchange,
-    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, ntilings=8, ntiles=16):
         super().__init__(name, utility, exchange)
-        self.learner = TabularSarsaMatrix(actions, epsilon, learning_rate, discount_factor)
+        self.learner = TileCodingSarsaMatrix(actions, epsilon, learning_rate, discount_factor,
+            (exchange.stock.minp, -exchange.max_holding), (exchange.stock.maxp, exchange.max_holding), ntilings, ntiles)
+
+class ReplaySarsaStockTrader(StockTrader):
+    ''' A stock trader whose internal learner is sarsa with a regressor trained on minibatches from a replay buffer
+    The features are scaled from the price range of the exchange's stock and the holdings allowed by the exchange
+    '''
+    def __init__(self, name: str, utility: float, exchange: StockExchange,
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, model=None,
+    capacity=10000, batch_size=32, update_every=4):
+        super().__init__(name, utility, exchange)
+        self.learner = ReplaySarsaMatrix(actions, epsilon, learning_rate, discount_factor,
+            (exchange.stock.minp, -exchange.max_holding), (exchange.stock.maxp, exchange.max_holding), model,
+            capacity, batch_size, update_every)
 
 class RFSarsaStockTrader(StockTrader):
     ''' A stock trader whose internal learner is random forest sarsa matrix
     '''
     def __init__(self, name: str, utility: float, exchange: StockExchange,
-    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, scheduler=None,
+    q_capacity=None, eviction='lru'):
         super().__init__(name, utility, exchange)
-        self.learner = RandomForestSarsaMatrix(actions, epsilon, learning_rate, discount_factor)
+        q_table = BoundedQStore(q_capacity, eviction) if q_capacity else None
+        self.learner = RandomForestSarsaMatrix(actions, epsilon, learning_rate, discount_factor, scheduler=scheduler, q_table=q_table)
 
 class GbmSarsaStockTrader(StockTrader):
     ''' A stock trader whose internal learner is sarsa matrix with gradient boosting
     '''
     def __init__(self, name: str, utility: float, exchange: StockExchange,
-    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, scheduler=None,
+    q_capacity=None, eviction='lru'):
         super().__init__(name, utility, exchange)
-        self.learner = GbmSarsaMatrix(actions, epsilon, learning_rate, discount_factor)
+        q_table = BoundedQStore(q_capacity, eviction) if q_capacity else None
+        self.learner = GbmSarsaMatrix(actions, epsilon, learning_rate, discount_factor, scheduler=scheduler, q_table=q_table)
 
 class SvrSarsaStockTrader(StockTrader):
     ''' A stock trader whose internal learner is sarsa matrix with SVR
     '''
     def __init__(self, name: str, utility: float, exchange: StockExchange,
-    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float):
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, scheduler=None,
+    q_capacity=None, eviction='lru'):
         super().__init__(name, utility, exchange)
-        self.learner = SvrSarsaMatrix(actions, epsilon, learning_rate, discount_factor)
\ No newline at end of file
+        q_table = BoundedQStore(q_capacity, eviction) if q_capacity else None
+        self.learner = SvrSarsaMatrix(actions, epsilon, learning_rate, discount_factor, scheduler=scheduler, q_table=q_table)
+
+class MultiAssetStockTrader(StockTrader):
+    ''' A stock trader of every stock on a MultiAssetExchange, with one internal learner per stock
+    The learner of stock i sees the state (price_i, holding_i) and learns from the reward of stock i alone.
+    holding, transaction_cost, wealth and reward are arrays with one value per stock, so get_updated_price
+    updates all stocks at once. Actions are given in lots, and scaled by the lot of each stock
+    Attributes:
+        learners (list): the internal learner of each stock, of a learner type of the registry
+    '''
+    def __init__(self, name: str, utility: float, exchange: MultiAssetExchange,
+    actions: tuple, epsilon: float, learning_rate: float, discount_factor: float, learner='tabular sarsa', seed=None):
+        super().__init__(name, utility, exchange)
+        self.learners = [create_learner(learner, tuple(int(a * lot) for a in actions), epsilon, learning_rate,
+            discount_factor) for lot in exchange.lot.tolist()]
+        if seed is not None:
+            for learner, child in zip(self.learners, np.random.SeedSequence(seed).spawn(len(self.learners))):
+                learner.reseed(child)
+        self.reset_episode()
+
+    # Override
+    def reset_episode(self):
+        n = len(self.exchange)
+        self.holding = np.zeros(n, dtype=np.int64)
+        self.transaction_cost = np.zeros(n)
+        self.wealth = np.zeros(n)
+        self.step_count = 0
+        self.reward = None
+        self.state = (self.exchange.curr_price, self.holding)
+        for learner in self.learners:
+            learner.reset_episode()
+
+    # Override
+    def warm_start(self, filename: str):
+        ''' Load the learner of each stock from the checkpoints filename.0.npz, filename.1.npz, ...
+        '''
+        for i, learner in enumerate(self.learners):
+            learner.load('{}.{}.npz'.format(filename, i))
+
+    # Override
+    def place_order(self):
+        prices, holdings = self.state[0].tolist(), self.state[1].tolist()
+        rewards = [None] * len(prices) if self.reward is None else self.reward.tolist()
+        orders = np.array([learner.learn(reward, (price, holding))
+            for learner, reward, price, holding in zip(self.learners, rewards, prices, holdings)], dtype=np.int64)
+        orders = self.exchange.clip_orders(self.holding, orders)
+        self.transaction_cost = self.exchange.execute(orders)
+        self.holding = self.holding + orders
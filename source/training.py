@@ -0,0 +1,115 @@
+import numpy as np
+
+class TrainingMatrix(object):
+    ''' A growable, preallocated columnar store of training rows, one row (features, target) per key
+    Rows are written in place. The arrays double in capacity when full and halve when at most a quarter full,
+    so that both growth and removal are amortized O(1). X and Y are views, not copies, of the stored rows.
+    Attributes:
+        nfeatures (int): number of feature columns
+        _X (np.ndarray): preallocated features with shape (capacity, nfeatures)
+        _Y (np.ndarray): preallocated targets with shape (capacity,)
+        _rows (dict): map each key to its row index
+        _keys (list): the key of each stored row, in row order
+    '''
+    def __init__(self, nfeatures: int, capacity=1024, dtype=np.float64):
+        assert nfeatures > 0 and capacity > 0
+        self.nfeatures = nfeatures
+        self._min_capacity = capacity
+        self._X = np.empty((capacity, nfeatures), dtype=dtype)
+        self._Y = np.empty(capacity, dtype=dtype)
+        self._rows = dict()
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    @property
+    def capacity(self):
+        return len(self._Y)
+
+    @property
+    def X(self):
+        ''' np.ndarray: view of the features of all stored rows
+        '''
+        return self._X[:len(self._keys)]
+
+    @property
+    def Y(self):
+        ''' np.ndarray: view of the targets of all stored rows
+        '''
+        return self._Y[:len(self._keys)]
+
+    @property
+    def nbytes(self):
+        ''' int: bytes held by the preallocated arrays
+        '''
+        return self._X.nbytes + self._Y.nbytes
+
+    def _resize(self, capacity: int):
+        n = len(self._keys)
+        X = np.empty((capacity, self.nfeatures), dtype=self._X.dtype)
+        Y = np.empty(capacity, dtype=self._Y.dtype)
+        X[:n] = self._X[:n]
+        Y[:n] = self._Y[:n]
+        self._X, self._Y = X, Y
+
+    def set(self, key, features, value: float):
+        ''' Write the row of key in place, appending it if the key is new
+        Args:
+            key (object): hashable key of the row, e.g. the tuple (s,a)
+            features (list): the feature values of the row
+            value (float): the target of the row
+        '''
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            if row == self.capacity:
+                self._resize(2 * self.capacity)
+            self._rows[key] = row
+            self._keys.append(key)
+            self._X[row] = features
+        self._Y[row] = value
+
+    def remove(self, key):
+        ''' Remove the row of key by moving the last row into its place, and compact if mostly empty
+        Args:
+            key (object): hashable key of the row
+        '''
+        row = self._rows.pop(key)
+        last = len(self._keys) - 1
+        last_key = self._keys.pop()
+        if row != last:
+            self._X[row] = self._X[last]
+            self._Y[row] = self._Y[last]
+            self._keys[row] = last_key
+            self._rows[last_key] = row
+        if last <= self.capacity // 4 and self.capacity > self._min_capacity:
+            self._resize(max(self.capacity // 2, self._min_capacity))
+
+    def assign(self, keys: list, X: np.ndarray, Y: np.ndarray):
+        ''' Replace all rows at once, e.g. when restoring from a checkpoint
+        Args:
+            keys (list): the key of each row
+            X (np.ndarray): features with shape (len(keys), nfeatures)
+            Y (np.ndarray): targets with shape (len(keys),)
+        '''
+        assert X.shape == (len(keys), self.nfeatures) and Y.shape == (len(keys),)
+        capacity = self._min_capacity
+        while capacity < len(keys):
+            capacity *= 2
+        self._X = np.empty((capacity, self.nfeatures), dtype=self._X.dtype)
+        self._Y = np.empty(capacity, dtype=self._Y.dtype)
+        self._X[:len(keys)] = X
+        self._Y[:len(keys)] = Y
+        self._keys = list(keys)
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+
+    def clear(self):
+        ''' Remove all rows and release the grown arrays
+        '''
+        self._rows.clear()
+        self._keys.clear()
+        self._resize(self._min_capacity)